@@ -1,25 +1,76 @@
-from flask import Flask, render_template, session, redirect, url_for, flash, request, jsonify
+from flask import Flask, Blueprint, current_app, render_template, session, redirect, url_for, flash, request, jsonify
 from flask_bootstrap import Bootstrap
+from jinja2 import FileSystemBytecodeCache, TemplateNotFound
 import os
 from services.api_service import ApiService
 from services.validacion_acceso import validar_acceso
+from services.perfilador import Perfilador
+from services.activos_estaticos import ActivosEstaticos, crear_directorio_privado
 
 from config import config
 
-app = Flask(__name__)
-app.config.from_object(config[os.getenv("FLASK_ENV", "development")])
-Bootstrap(app)
+# Páginas y endpoints del frontend; se registran en la aplicación creada por crear_app()
+frontend = Blueprint("frontend", __name__)
 
-# Inicializa ApiService para conectar con la API externa
-api_service = ApiService(app.config["API_BASE_URL"])
+# ApiService para conectar con la API externa (la URL base se asigna en crear_app)
+api_service = ApiService(None)
+
+# Perfilado opcional de solicitudes (muestreo 1 de N o encabezado X-Perfil) y registro de solicitudes lentas
+perfilador = Perfilador()
+
+# Archivos estáticos con huella de contenido, precomprimidos y con caché de larga duración
+activos_estaticos = ActivosEstaticos()
+
+
+def crear_app(nombre_config=None):
+    """Crea y configura la aplicación Flask (fábrica de aplicaciones)."""
+    app = Flask(__name__)
+    app.config.from_object(config[nombre_config or os.getenv("FLASK_ENV", "development")])
+    Bootstrap(app)
+
+    api_service.base_url = app.config["API_BASE_URL"]
+    perfilador.init_app(app)
+    activos_estaticos.init_app(app)
+
+    # Caché persistente del código compilado de las plantillas: los trabajadores nuevos no las recompilan.
+    # Guarda código que se ejecuta al cargarlo, así que el directorio debe ser privado; sin configuración,
+    # Jinja usa su propio directorio por usuario (modo 0700, con comprobación del propietario)
+    directorio_plantillas = app.config["PLANTILLAS_DIRECTORIO_CACHE"]
+    if directorio_plantillas:
+        crear_directorio_privado(directorio_plantillas)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directorio_plantillas)
+    else:
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
+
+    # Índice de las plantillas propias que existen, para responder 404 sin buscar plantillas inexistentes
+    app.extensions["indice_plantillas"] = frozenset(app.jinja_loader.list_templates())
+
+    app.register_blueprint(frontend)
+    return app
+
+
+def preparar_trabajador(app):
+    """Compila las plantillas antes de que el proceso trabajador reciba tráfico.
+
+    Returns:
+        bool: True si todas las plantillas se compilaron.
+    """
+    correcto = True
+    for nombre in app.jinja_env.list_templates(extensions=["html"]):
+        try:
+            app.jinja_env.get_template(nombre)
+        except Exception as e:
+            print(f"No se pudo compilar la plantilla {nombre}: {e}")
+            correcto = False
+    return correcto
 
 # Ruta principal
-@app.route("/")
+@frontend.route("/")
 def index():
     return render_template("index.html")
 
 # Ruta de login
-@app.route("/login", methods=["GET", "POST"])
+@frontend.route("/login", methods=["GET", "POST"])
 def login():
     if request.method == "POST":
         datos = request.json  # Obtener el correo y contraseña del cliente
@@ -42,41 +93,41 @@ def login():
                 # Aquí podrías realizar una solicitud adicional para obtener roles y rutas específicas del usuario
 
                 flash("Inicio de sesión exitoso", "success")
-                return redirect(url_for("dashboard"))
+                return redirect(url_for("frontend.dashboard"))
             else:
                 flash("Usuario o contraseña incorrectos.", "danger")
-                return redirect(url_for("login"))
+                return redirect(url_for("frontend.login"))
         except Exception as e:
             flash("Error al iniciar sesión. Intenta nuevamente.", "danger")
-            return redirect(url_for("login"))
+            return redirect(url_for("frontend.login"))
 
     # GET request, renderiza el formulario de login
     return render_template("login.html")
 
 # Ruta de cierre de sesión
-@app.route("/logout")
+@frontend.route("/logout")
 def logout():
     # Limpiar la sesión del usuario
     session.clear()
     
     # Redirigir al usuario a la página de login con un mensaje de confirmación
     flash("Has cerrado sesión exitosamente.", "info")
-    return redirect(url_for("login"))
+    return redirect(url_for("frontend.login"))
 
 # Ruta protegida del dashboard
-@app.route("/dashboard")
+@frontend.route("/dashboard")
 @validar_acceso("/dashboard")
 def dashboard():
     return render_template("dashboard.html")
 
 # Ruta para la página de clima
-@app.route("/weather")
+@frontend.route("/weather")
 @validar_acceso("/weather")
 def weather():
     return render_template("weather.html")
 
 # API para obtener datos del clima desde la API externa
-@app.route("/api/weather")
+@frontend.route("/api/weather")
 def get_weather_data():
     try:
         weather_data = api_service.get("weather")
@@ -85,13 +136,13 @@ def get_weather_data():
         return jsonify({"error": str(e)}), 500
 
 # Página para gestionar personas
-@app.route("/persona")
+@frontend.route("/persona")
 @validar_acceso("/persona")
 def persona():
     return render_template("persona.html")
 
 # Endpoint para obtener todas las personas usando la API externa
-@app.route("/api/personas", methods=["GET"])
+@frontend.route("/api/personas", methods=["GET"])
 def obtener_personas():
     try:
         personas = api_service.get("proyecto/persona")
@@ -100,7 +151,7 @@ def obtener_personas():
         return jsonify({"error": str(e)}), 500
 
 # Endpoint para agregar una nueva persona usando la API externa
-@app.route("/api/personas", methods=["POST"])
+@frontend.route("/api/personas", methods=["POST"])
 def agregar_persona():
     nueva_persona = request.json
     try:
@@ -110,7 +161,7 @@ def agregar_persona():
         return jsonify({"error": str(e)}), 500
 
 # Endpoint para actualizar una persona usando la API externa
-@app.route("/api/personas/<codigo>", methods=["PUT"])
+@frontend.route("/api/personas/<codigo>", methods=["PUT"])
 def actualizar_persona(codigo):
     persona_actualizada = request.json
     try:
@@ -120,7 +171,7 @@ def actualizar_persona(codigo):
         return jsonify({"error": str(e)}), 500
 
 # Endpoint para eliminar una persona usando la API externa
-@app.route("/api/personas/<codigo>", methods=["DELETE"])
+@frontend.route("/api/personas/<codigo>", methods=["DELETE"])
 def eliminar_persona(codigo):
     try:
         response = api_service.delete(f"proyecto/persona/{codigo}")
@@ -129,13 +180,13 @@ def eliminar_persona(codigo):
         return jsonify({"error": str(e)}), 500
 
 # Ruta para la página de listado de datos
-@app.route("/list-table")
+@frontend.route("/list-table")
 @validar_acceso("/list-table")
 def list_table():
     return render_template("list_table.html")
 
 # Endpoint para obtener los datos de la lista desde la API externa
-@app.route("/api/list-data", methods=["GET"])
+@frontend.route("/api/list-data", methods=["GET"])
 def obtener_datos_lista():
     try:
         data = api_service.get("proyecto/persona")  # Reemplaza con el endpoint correcto
@@ -144,17 +195,23 @@ def obtener_datos_lista():
         return jsonify({"error": str(e)}), 500
 
 # Ruta dinámica para cargar diferentes páginas
-@app.route("/<path:page>")
+@frontend.route("/<path:page>")
 def render_page(page):
+    plantilla = f"{page}.html"
+    if plantilla not in current_app.extensions["indice_plantillas"]:
+        return render_template("404.html"), 404
     try:
-        return render_template(f"{page}.html")
-    except:
+        return render_template(plantilla)
+    except TemplateNotFound:
+        # La página existe pero extiende o incluye una plantilla que no existe
         return render_template("404.html"), 404
 
 # Manejador de error 404 global
-@app.errorhandler(404)
+@frontend.app_errorhandler(404)
 def page_not_found(e):
     return render_template("404.html"), 404
 
+# Servidor de desarrollo (en producción usar: gunicorn -c gunicorn.conf.py)
 if __name__ == "__main__":
+    app = crear_app()
     app.run(debug=app.config["DEBUG"])
@@ -9,9 +9,32 @@ class Config:
     DEBUG = os.getenv("FLASK_DEBUG", "False") == "True"
     API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:5184/")
 
+    # Servidor de producción: procesos trabajadores (0 = calcular según los núcleos), hilos por proceso
+    # y segundos que se esperan las solicitudes en curso al apagar
+    SERVIDOR_TRABAJADORES = int(os.getenv("SERVIDOR_TRABAJADORES", "0"))
+    SERVIDOR_HILOS = int(os.getenv("SERVIDOR_HILOS", "4"))
+    SERVIDOR_TIEMPO_APAGADO = int(os.getenv("SERVIDOR_TIEMPO_APAGADO", "30"))
+
+    # Perfilado: 1 de cada N solicitudes (0 desactiva), token del encabezado X-Perfil para perfilar
+    # a pedido y descargar las capturas, tamaño del buffer y umbral (segundos) de solicitud lenta
+    PERFIL_MUESTREO = int(os.getenv("PERFIL_MUESTREO", "0"))
+    PERFIL_TOKEN = os.getenv("PERFIL_TOKEN")
+    PERFIL_MAX_CAPTURAS = int(os.getenv("PERFIL_MAX_CAPTURAS", "50"))
+    PERFIL_UMBRAL_LENTO = float(os.getenv("PERFIL_UMBRAL_LENTO", "2.0"))
+
+    # Archivos estáticos: nombres con huella de contenido y variantes gzip/brotli guardadas en el directorio de caché
+    # (por defecto <instance_path>/activos; debe ser privado, porque las variantes se sirven sin volver a validarlas)
+    ACTIVOS_HUELLA = os.getenv("ACTIVOS_HUELLA", "True") == "True"
+    ACTIVOS_DIRECTORIO_CACHE = os.getenv("ACTIVOS_DIRECTORIO_CACHE")
+    ACTIVOS_MAX_EDAD = int(os.getenv("ACTIVOS_MAX_EDAD", "31536000"))  # Un año
+
+    # Directorio de la caché de bytecode de las plantillas Jinja (por defecto, el directorio privado por usuario de Jinja)
+    PLANTILLAS_DIRECTORIO_CACHE = os.getenv("PLANTILLAS_DIRECTORIO_CACHE")
+
 class DevelopmentConfig(Config):
     ENV = "development"
     DEBUG = True
+    ACTIVOS_HUELLA = False  # En desarrollo los archivos cambian sin reiniciar el servidor
 
 class ProductionConfig(Config):
     ENV = "production"
@@ -0,0 +1,35 @@
+# Configuración de gunicorn para producción: gunicorn -c gunicorn.conf.py
+import multiprocessing
+import os
+
+from config import Config
+
+# Aplicación WSGI y dirección de escucha
+wsgi_app = "wsgi:app"
+bind = os.getenv("SERVIDOR_DIRECCION", "0.0.0.0:5000")
+
+# Procesos trabajadores: los de la configuración o, si es 0, según los núcleos disponibles.
+# Cada proceso atiende varias solicitudes a la vez con hilos (el frontend espera sobre todo a la API).
+workers = Config.SERVIDOR_TRABAJADORES or multiprocessing.cpu_count() * 2 + 1
+worker_class = "gthread"
+threads = Config.SERVIDOR_HILOS
+
+# La aplicación se carga en cada trabajador (después del fork)
+preload_app = False
+
+# Apagado ordenado: al recibir SIGTERM se dejan de aceptar conexiones y se esperan las solicitudes en curso
+graceful_timeout = Config.SERVIDOR_TIEMPO_APAGADO
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+
+
+def post_worker_init(worker):
+    # Se ejecuta en cada trabajador después del fork y de cargar la aplicación, antes de aceptar tráfico
+    from app import preparar_trabajador
+
+    if preparar_trabajador(worker.wsgi):
+        worker.log.info("Trabajador %s listo (plantillas compiladas).", worker.pid)
+    else:
+        worker.log.warning("Trabajador %s listo, pero algunas plantillas no se compilaron.", worker.pid)
@@ -0,0 +1,158 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import stat
+
+from flask import request, send_file
+
+try:
+    import brotli  # Opcional: si no está instalado solo se generan variantes gzip
+except ImportError:
+    brotli = None
+
+# Extensiones de texto que vale la pena precomprimir
+EXTENSIONES_COMPRIMIBLES = {".css", ".js", ".json", ".map", ".svg", ".txt", ".html", ".xml"}
+TAMANO_MINIMO_COMPRESION = 1024
+
+
+def crear_directorio_privado(ruta):
+    """Crea (si no existe) un directorio accesible solo por el usuario actual.
+
+    Los archivos que se guardan en él se sirven o ejecutan sin volver a validarlos, así que
+    otro usuario del equipo no debe poder crearlos ni reemplazarlos.
+
+    Args:
+        ruta (str): Directorio a crear.
+
+    Raises:
+        RuntimeError: Si la ruta no es un directorio o pertenece a otro usuario.
+    """
+    os.makedirs(ruta, mode=0o700, exist_ok=True)
+    info = os.lstat(ruta)
+    if not stat.S_ISDIR(info.st_mode):
+        raise RuntimeError(f"{ruta} no es un directorio.")
+    if hasattr(os, "getuid"):  # En Windows no hay propietario ni permisos POSIX que revisar
+        if info.st_uid != os.getuid():
+            raise RuntimeError(f"El directorio {ruta} pertenece a otro usuario.")
+        if stat.S_IMODE(info.st_mode) & 0o077:
+            os.chmod(ruta, 0o700)
+
+
+class ActivosEstaticos:
+    """Canal de archivos estáticos con huella de contenido.
+
+    Al iniciar calcula el hash de cada archivo de ``static/`` y genera un manifiesto
+    (``css/app.css`` -> ``css/app.1a2b3c4d5e6f.css``). ``url_for('static', ...)`` devuelve el
+    nombre con huella, que se sirve con ``Cache-Control: immutable`` y, si el cliente lo
+    acepta, desde una variante precomprimida (brotli o gzip).
+    """
+
+    def __init__(self, app=None):
+        """Inicializa el canal; si se pasa la aplicación, llama a init_app."""
+        self.manifiesto = {}
+        self._originales = {}
+        self._directorio_cache = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Genera el manifiesto y las variantes comprimidas, y reemplaza la vista de estáticos.
+
+        Args:
+            app (Flask): Aplicación cuyos archivos estáticos se van a servir.
+        """
+        app.config.setdefault("ACTIVOS_HUELLA", True)
+        app.config.setdefault("ACTIVOS_DIRECTORIO_CACHE", None)
+        app.config.setdefault("ACTIVOS_MAX_EDAD", 31536000)
+
+        self._carpeta = app.static_folder
+        self._max_edad = app.config["ACTIVOS_MAX_EDAD"]
+        self._directorio_cache = app.config["ACTIVOS_DIRECTORIO_CACHE"] or os.path.join(app.instance_path, "activos")
+
+        @app.cli.command("precomprimir-activos")
+        def precomprimir_activos():
+            """Genera el manifiesto y las variantes gzip/brotli de los archivos estáticos."""
+            self.construir()
+            print(f"{len(self.manifiesto)} archivos estáticos procesados en {self._directorio_cache}")
+
+        if not app.config["ACTIVOS_HUELLA"] or not self._carpeta:
+            return
+
+        self.construir()
+        app.url_defaults(self._agregar_huella)
+        app.view_functions["static"] = self._servir(app.view_functions["static"])
+
+    def construir(self):
+        """Calcula la huella de cada archivo estático y genera sus variantes comprimidas."""
+        crear_directorio_privado(self._directorio_cache)
+        manifiesto = {}
+        for raiz, _, archivos in os.walk(self._carpeta):
+            for nombre in archivos:
+                ruta = os.path.join(raiz, nombre)
+                relativo = os.path.relpath(ruta, self._carpeta).replace(os.sep, "/")
+                with open(ruta, "rb") as archivo:
+                    contenido = archivo.read()
+
+                base, extension = os.path.splitext(relativo)
+                con_huella = f"{base}.{hashlib.sha256(contenido).hexdigest()[:12]}{extension}"
+                manifiesto[relativo] = con_huella
+
+                if extension.lower() in EXTENSIONES_COMPRIMIBLES and len(contenido) >= TAMANO_MINIMO_COMPRESION:
+                    self._precomprimir(con_huella, contenido)
+
+        self.manifiesto = manifiesto
+        self._originales = {con_huella: original for original, con_huella in manifiesto.items()}
+
+    def _precomprimir(self, con_huella, contenido):
+        # El nombre lleva la huella, así que si la variante ya existe no hace falta regenerarla
+        # (el directorio es privado: solo este usuario pudo haberla escrito)
+        variantes = [("gz", lambda datos: gzip.compress(datos, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variantes.append(("br", lambda datos: brotli.compress(datos, quality=11)))
+
+        for sufijo, comprimir in variantes:
+            destino = os.path.join(self._directorio_cache, f"{con_huella}.{sufijo}")
+            if os.path.exists(destino):
+                continue
+            os.makedirs(os.path.dirname(destino), mode=0o700, exist_ok=True)
+            temporal = f"{destino}.{os.getpid()}.tmp"
+            with open(temporal, "wb") as archivo:
+                archivo.write(comprimir(contenido))
+            os.replace(temporal, destino)
+
+    def _agregar_huella(self, endpoint, valores):
+        # Reescribe url_for('static', filename=...) con el nombre que incluye la huella
+        if endpoint == "static" and "filename" in valores:
+            valores["filename"] = self.manifiesto.get(valores["filename"], valores["filename"])
+
+    def _servir(self, vista_original):
+        def servir_estatico(filename):
+            original = self._originales.get(filename)
+            if original is None:
+                # Nombre sin huella (por ejemplo, referencias relativas dentro de un CSS)
+                return vista_original(filename=filename)
+
+            tipo, _ = mimetypes.guess_type(original)
+            ruta = os.path.join(self._carpeta, *original.split("/"))
+            codificacion = None
+
+            # Se elige la variante existente con mayor calidad (q) en Accept-Encoding; q=0 la rechaza.
+            # A igual calidad se prefiere brotli, que comprime más.
+            mejor_calidad = 0
+            for sufijo, nombre_codificacion in (("br", "br"), ("gz", "gzip")):
+                calidad = request.accept_encodings.quality(nombre_codificacion)
+                variante = os.path.join(self._directorio_cache, f"{filename}.{sufijo}")
+                if calidad > mejor_calidad and os.path.exists(variante):
+                    ruta, codificacion, mejor_calidad = variante, nombre_codificacion, calidad
+
+            # Content-Disposition con el nombre publicado, no el de la variante .gz/.br (igual que la vista original)
+            respuesta = send_file(ruta, mimetype=tipo or "application/octet-stream", conditional=True, etag=True,
+                                  download_name=filename.rsplit("/", 1)[-1])
+            respuesta.headers["Cache-Control"] = f"public, max-age={self._max_edad}, immutable"
+            respuesta.headers["Vary"] = "Accept-Encoding"
+            if codificacion:
+                respuesta.headers["Content-Encoding"] = codificacion
+            return respuesta
+
+        return servir_estatico
@@ -1,4 +1,7 @@
 import requests
+from flask import has_request_context, request
+
+from services.perfilador import medir
 
 class ApiService:
     """Servicio para manejar las operaciones CRUD con una API externa.
@@ -9,6 +12,90 @@ class ApiService:
         """Inicializa el servicio con la URL base de la API."""
         self.base_url = base_url
 
+    def _encabezados(self):
+        """Encabezados que identifican ante la API al cliente original de la solicitud.
+
+        La API ve todas las llamadas como si vinieran del frontend; con X-Forwarded-For
+        (la cadena recibida más la IP del cliente) puede aplicar la cuota de cada usuario
+        por separado si confía en este salto (PROXIES_CONFIABLES en la API).
+
+        Returns:
+            dict: Encabezados a enviar (vacío fuera de una solicitud).
+        """
+        if not has_request_context() or not request.remote_addr:
+            return {}
+        cadena = request.headers.get("X-Forwarded-For")
+        return {"X-Forwarded-For": f"{cadena}, {request.remote_addr}" if cadena else request.remote_addr}
+
+    def _solicitar(self, metodo, endpoint, **kwargs):
+        """Envía una solicitud a la API con los encabezados del cliente original.
+
+        Args:
+            metodo (str): Método HTTP (GET, POST, PUT, DELETE).
+            endpoint (str): Ruta relativa a la URL base de la API.
+
+        Returns:
+            requests.Response: La respuesta, ya verificada como exitosa (código 2xx).
+
+        Raises:
+            requests.RequestException: Si la solicitud falla o la API responde con error.
+        """
+        with medir("api"):
+            response = requests.request(metodo, f"{self.base_url}{endpoint}", headers=self._encabezados(), **kwargs)
+        response.raise_for_status()
+        return response
+
+    @staticmethod
+    def _contenido(response):
+        # Cuerpo JSON de la respuesta, o None si la API no devolvió contenido
+        return response.json() if response.content else None
+
+    def get(self, endpoint):
+        """Obtiene un recurso de la API.
+
+        Args:
+            endpoint (str): Ruta relativa a la URL base de la API.
+
+        Returns:
+            El contenido JSON de la respuesta.
+        """
+        return self._contenido(self._solicitar("GET", endpoint))
+
+    def post(self, endpoint, datos):
+        """Envía datos a la API con POST.
+
+        Args:
+            endpoint (str): Ruta relativa a la URL base de la API.
+            datos (dict): Cuerpo JSON de la solicitud.
+
+        Returns:
+            El contenido JSON de la respuesta.
+        """
+        return self._contenido(self._solicitar("POST", endpoint, json=datos))
+
+    def put(self, endpoint, datos):
+        """Envía datos a la API con PUT.
+
+        Args:
+            endpoint (str): Ruta relativa a la URL base de la API.
+            datos (dict): Cuerpo JSON de la solicitud.
+
+        Returns:
+            El contenido JSON de la respuesta.
+        """
+        return self._contenido(self._solicitar("PUT", endpoint, json=datos))
+
+    def delete(self, endpoint):
+        """Elimina un recurso de la API.
+
+        Args:
+            endpoint (str): Ruta relativa a la URL base de la API.
+
+        Returns:
+            El contenido JSON de la respuesta.
+        """
+        return self._contenido(self._solicitar("DELETE", endpoint))
+
     def get_data(self, endpoint):
         """Obtiene datos de la API de forma síncrona.
 
@@ -19,8 +106,7 @@ class ApiService:
             list: Una lista de diccionarios representando los datos obtenidos.
         """
         try:
-            response = requests.get(f"{self.base_url}{endpoint}")
-            response.raise_for_status()  # Asegura que la respuesta sea exitosa (código 2xx)
+            response = self._solicitar("GET", endpoint)  # Verifica que la respuesta sea exitosa (código 2xx)
             return response.json()  # Devuelve el contenido JSON como lista de diccionarios
         except requests.RequestException as e:
             print(f"Error al obtener datos: {e}")
@@ -37,8 +123,7 @@ class ApiService:
             bool: True si la operación fue exitosa, False en caso contrario.
         """
         try:
-            response = requests.post(f"{self.base_url}{endpoint}", json=entity)
-            response.raise_for_status()
+            self._solicitar("POST", endpoint, json=entity)
             return True
         except requests.RequestException as e:
             print(f"Error al añadir entidad: {e}")
@@ -56,8 +141,7 @@ class ApiService:
             bool: True si la operación fue exitosa, False en caso contrario.
         """
         try:
-            response = requests.put(f"{self.base_url}{endpoint}/{entity_id}", json=entity)
-            response.raise_for_status()
+            self._solicitar("PUT", f"{endpoint}/{entity_id}", json=entity)
             return True
         except requests.RequestException as e:
             print(f"Error al editar entidad: {e}")
@@ -74,8 +158,7 @@ class ApiService:
             bool: True si la operación fue exitosa, False en caso contrario.
         """
         try:
-            response = requests.delete(f"{self.base_url}{endpoint}/{entity_id}")
-            response.raise_for_status()
+            self._solicitar("DELETE", f"{endpoint}/{entity_id}")
             return True
         except requests.RequestException as e:
             print(f"Error al eliminar entidad: {e}")
@@ -0,0 +1,182 @@
+import cProfile
+import hmac
+import io
+import itertools
+import pstats
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+from flask import Response, abort, before_render_template, g, jsonify, request, template_rendered
+from flask.json.provider import DefaultJSONProvider
+
+# Tiempos por categoría de la solicitud en curso en cada hilo (None fuera de una solicitud)
+_estado = threading.local()
+
+# cProfile admite un solo perfil activo por proceso (desde Python 3.12 enable() falla si hay otro);
+# si ya se está perfilando otra solicitud, la nueva se atiende sin perfil
+_bloqueo_perfil = threading.Lock()
+
+
+@contextmanager
+def medir(categoria):
+    """Suma el tiempo del bloque a la categoría indicada (api, plantillas, serializacion...) de la solicitud actual."""
+    tiempos = getattr(_estado, "tiempos", None)
+    if tiempos is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        tiempos[categoria] = tiempos.get(categoria, 0.0) + time.perf_counter() - inicio
+
+
+class ProveedorJsonMedido(DefaultJSONProvider):
+    """Proveedor JSON que mide el tiempo de serialización de las respuestas."""
+
+    def dumps(self, obj, **kwargs):
+        with medir("serializacion"):
+            return super().dumps(obj, **kwargs)
+
+
+class Perfilador:
+    """Perfilado opcional de solicitudes.
+
+    Perfila con cProfile una de cada N solicitudes (PERFIL_MUESTREO) o las que traen el
+    encabezado X-Perfil con el token autorizado (PERFIL_TOKEN). Cada solicitud perfilada o
+    lenta (PERFIL_UMBRAL_LENTO) se guarda en un buffer circular de PERFIL_MAX_CAPTURAS
+    elementos, que se descarga desde /admin/perfiles con el mismo token.
+    """
+
+    def __init__(self, app=None):
+        """Inicializa el perfilador; si se pasa la aplicación, llama a init_app."""
+        self._capturas = deque()
+        self._bloqueo = threading.Lock()
+        self._contador = itertools.count(1)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Lee la configuración, registra los ganchos y las rutas de administración.
+
+        Args:
+            app (Flask): Aplicación a perfilar.
+        """
+        app.config.setdefault("PERFIL_MUESTREO", 0)
+        app.config.setdefault("PERFIL_TOKEN", None)
+        app.config.setdefault("PERFIL_MAX_CAPTURAS", 50)
+        app.config.setdefault("PERFIL_UMBRAL_LENTO", 2.0)
+        app.config.setdefault("PERFIL_LINEAS", 40)
+
+        self._muestreo = app.config["PERFIL_MUESTREO"]
+        self._token = app.config["PERFIL_TOKEN"]
+        self._umbral_lento = app.config["PERFIL_UMBRAL_LENTO"]
+        self._lineas = app.config["PERFIL_LINEAS"]
+        self._capturas = deque(maxlen=app.config["PERFIL_MAX_CAPTURAS"])
+
+        app.json = ProveedorJsonMedido(app)
+        app.before_request(self._iniciar)
+        app.after_request(self._finalizar)
+        app.teardown_request(self._limpiar)
+        before_render_template.connect(self._antes_de_plantilla, app)
+        template_rendered.connect(self._despues_de_plantilla, app)
+        app.add_url_rule("/admin/perfiles", "perfiles", self._listar_capturas, methods=["GET"])
+        app.add_url_rule("/admin/perfiles/<id_captura>", "perfil", self._descargar_captura, methods=["GET"])
+
+    def _token_valido(self):
+        encabezado = request.headers.get("X-Perfil", "")
+        # Se comparan bytes: compare_digest no admite str con caracteres fuera de ASCII
+        return bool(self._token) and hmac.compare_digest(encabezado.encode("utf-8"), self._token.encode("utf-8"))
+
+    def _iniciar(self):
+        _estado.tiempos = {}
+        g.perfil_inicio = time.perf_counter()
+        g.perfil = None
+
+        muestreada = self._muestreo > 0 and next(self._contador) % self._muestreo == 0
+        if (muestreada or self._token_valido()) and _bloqueo_perfil.acquire(blocking=False):
+            perfil = cProfile.Profile()
+            try:
+                perfil.enable()
+            except ValueError:
+                # Otra herramienta de perfilado (ajena a este perfilador) está activa
+                _bloqueo_perfil.release()
+                return
+            g.perfil = perfil
+
+    def _antes_de_plantilla(self, app, template, context, **extra):
+        _estado.inicio_plantilla = time.perf_counter()
+
+    def _despues_de_plantilla(self, app, template, context, **extra):
+        tiempos = getattr(_estado, "tiempos", None)
+        inicio = getattr(_estado, "inicio_plantilla", None)
+        if tiempos is not None and inicio is not None:
+            tiempos["plantillas"] = tiempos.get("plantillas", 0.0) + time.perf_counter() - inicio
+
+    def _finalizar(self, respuesta):
+        perfil = g.pop("perfil", None)
+        if perfil is not None:
+            perfil.disable()
+            _bloqueo_perfil.release()
+
+        inicio = g.get("perfil_inicio")
+        if inicio is None:
+            return respuesta
+        duracion = time.perf_counter() - inicio
+        lenta = duracion >= self._umbral_lento
+        if perfil is None and not lenta:
+            return respuesta
+
+        captura = {
+            "id": uuid.uuid4().hex,
+            "fecha": time.time(),
+            "metodo": request.method,
+            "ruta": request.path,
+            "estado": respuesta.status_code,
+            "duracion": round(duracion, 6),
+            "tiempos": {k: round(v, 6) for k, v in getattr(_estado, "tiempos", {}).items()},
+            "perfil": self._resumen_perfil(perfil) if perfil is not None else None,
+        }
+        with self._bloqueo:
+            self._capturas.append(captura)
+
+        if lenta:
+            print(f"Solicitud lenta ({duracion:.3f} s): {request.method} {request.path} tiempos={captura['tiempos']}")
+        return respuesta
+
+    def _limpiar(self, excepcion=None):
+        # Si la solicitud falló antes de after_request, el perfil sigue activo y hay que liberarlo
+        perfil = g.pop("perfil", None)
+        if perfil is not None:
+            perfil.disable()
+            _bloqueo_perfil.release()
+        _estado.tiempos = None
+        _estado.inicio_plantilla = None
+
+    def _resumen_perfil(self, perfil):
+        salida = io.StringIO()
+        pstats.Stats(perfil, stream=salida).sort_stats("cumulative").print_stats(self._lineas)
+        return salida.getvalue()
+
+    def _listar_capturas(self):
+        """Lista las capturas guardadas (sin el detalle del perfil)."""
+        if not self._token_valido():
+            abort(403)
+        with self._bloqueo:
+            capturas = [{k: v for k, v in c.items() if k != "perfil"} for c in self._capturas]
+        return jsonify(capturas)
+
+    def _descargar_captura(self, id_captura):
+        """Descarga una captura: JSON completo o, con ?formato=texto, solo el informe de cProfile."""
+        if not self._token_valido():
+            abort(403)
+        with self._bloqueo:
+            captura = next((c for c in self._capturas if c["id"] == id_captura), None)
+        if captura is None:
+            return jsonify({"mensaje": "Captura no encontrada."}), 404
+        if request.args.get("formato") == "texto":
+            return Response(captura["perfil"] or "", mimetype="text/plain")
+        return jsonify(captura)
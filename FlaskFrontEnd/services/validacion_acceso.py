@@ -17,12 +17,12 @@ def validar_acceso(ruta_permitida):
             # Si el usuario no está logueado, redirigir a login
             if not usuario_email:
                 flash("Sesión no válida. Redirigiendo al login...", "error")
-                return redirect(url_for("login"))
+                return redirect(url_for("frontend.login"))
 
             # Verificar si la ruta actual está en las rutas permitidas
             if ruta_permitida not in rutas_permitidas:
                 flash("No tienes permisos para acceder a esta página", "error")
-                return redirect(url_for("index"))
+                return redirect(url_for("frontend.index"))
 
             # Si todo está correcto, permitir el acceso
             return func(*args, **kwargs)
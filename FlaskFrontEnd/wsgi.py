@@ -0,0 +1,8 @@
+# Punto de entrada WSGI para el servidor de producción (gunicorn -c gunicorn.conf.py)
+import os
+
+from app import crear_app
+
+# No se usa FLASK_ENV (el .env del proyecto lo deja en development, con DEBUG activo): bajo gunicorn la
+# configuración es la de producción salvo que SERVIDOR_CONFIG indique otra
+app = crear_app(os.getenv("SERVIDOR_CONFIG", "production"))
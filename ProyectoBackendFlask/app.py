@@ -1,44 +1,152 @@
 import datetime
-from flask import Flask, request, jsonify
+import math
+from flask import Flask, Blueprint, current_app, request, jsonify, Response, url_for, stream_with_context
 from flask_cors import CORS
-from services.ControlConexion import ControlConexion
+from services.ControlConexion import (ControlConexion, TiempoLimiteExcedido, obtener_estadisticas_sql,
+                                      inicializar_pool, cerrar_pool)
+from services.GestorTrabajos import GestorTrabajos, ColaTrabajosLlena
+from services.Exportacion import FORMATOS_EXPORTACION, exportar
+from services.ControlAdmision import ControlAdmision
+from services.CacheEsquema import CacheEsquema
+from services.Perfilador import Perfilador, medir
+from models.Entidad import Entidad
+from config import config
 from dotenv import load_dotenv
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
 import os
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.security import generate_password_hash
 import bcrypt
 
 # Cargar las variables desde .env
 load_dotenv()
 
-# Crear la aplicación Flask
-app = Flask(__name__)
+# Rutas de la API; se registran en la aplicación creada por crear_app()
+api = Blueprint('api', __name__)
 
-# Configurar la conexión a la base de datos y otros ajustes desde config.py
-app.config.from_pyfile('config.py')
+# Instancia para la conexión a la base de datos (similar a agregar singleton); cada hilo usa su propia conexión
+control_conexion = ControlConexion()
 
-# Configuración JWT
-app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')  # Clave secreta desde .env
-jwt = JWTManager(app)
+# Caché con el tipo de dato de cada columna, para no consultar information_schema en cada solicitud
+cache_esquema = CacheEsquema()
+
+# Gestor de trabajos asíncronos: cada trabajo abre su propia conexión a la base de datos
+gestor_trabajos = GestorTrabajos(ControlConexion)
+
+# Control de admisión: rechaza con 429/503 en lugar de encolar sin límite cuando hay sobrecarga
+control_admision = ControlAdmision()
+
+# Perfilado opcional de solicitudes (muestreo 1 de N o encabezado X-Perfil) y registro de solicitudes lentas
+perfilador = Perfilador()
+
+jwt = JWTManager()
 
-# Instancia para la conexión a la base de datos (similar a agregar singleton)
-control_conexion = ControlConexion()
 
-# Configurar CORS para permitir solicitudes de cualquier origen (similar a AllowAllOrigins en C#)
-CORS(app)
+def crear_app(nombre_config=None):
+    """Crea y configura la aplicación Flask (fábrica de aplicaciones)."""
+    app = Flask(__name__)
 
-# Activar el modo de desarrollo si estamos en ese entorno
-if os.getenv('FLASK_ENV') == 'development':
-    app.config['DEBUG'] = True  # Activa la página detallada de excepciones
-    app.config['ENV'] = 'development'
+    # Configurar la conexión a la base de datos y otros ajustes desde config.py según el entorno
+    nombre_config = nombre_config or os.getenv('FLASK_ENV', 'development')
+    app.config.from_object(config[nombre_config])
 
+    # Configuración JWT
+    app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')  # Clave secreta desde .env
+    jwt.init_app(app)
 
-@app.route('/')
+    # Detrás del frontend o de un proxy, la IP del cliente (usada en la cuota por cliente) viene en X-Forwarded-For
+    if app.config['PROXIES_CONFIABLES'] > 0:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXIES_CONFIABLES'])
+
+    gestor_trabajos.init_app(app)
+    control_admision.init_app(app)
+    perfilador.init_app(app)
+
+    # Configurar CORS para permitir solicitudes de cualquier origen (similar a AllowAllOrigins en C#)
+    CORS(app)
+
+    app.register_blueprint(api)
+    return app
+
+
+def preparar_trabajador(app):
+    """Prepara un proceso trabajador antes de que reciba tráfico: crea su pool de
+    conexiones y carga la caché del esquema. Devuelve True si todo se cargó."""
+    try:
+        inicializar_pool(app.config['SQL_TAMANO_POOL'])
+        control_conexion.abrir_bd(app.config['SQL_TIEMPO_LIMITE'])
+        try:
+            cache_esquema.precargar(control_conexion)
+        finally:
+            control_conexion.cerrar_bd()
+        return True
+    except Exception as ex:
+        # El trabajador puede atender igual; las conexiones y el esquema se cargarán bajo demanda
+        print(f"No se pudo preparar el trabajador: {str(ex)}")
+        return False
+
+
+def cerrar_trabajador(app):
+    """Libera los recursos del proceso al apagarse: cancela los trabajos en curso y cierra el pool."""
+    gestor_trabajos.cerrar(tiempo_espera=app.config['TRABAJOS_TIEMPO_APAGADO'])
+    cerrar_pool()
+
+
+# Calcula el tiempo límite (segundos) de las sentencias SQL de la solicitud actual.
+# El valor por defecto viene de la configuración y el cliente solo puede reducirlo con el encabezado X-Tiempo-Limite.
+def obtener_tiempo_limite():
+    tiempo_limite = current_app.config['SQL_TIEMPO_LIMITE']
+    encabezado = request.headers.get('X-Tiempo-Limite')
+    if encabezado:
+        try:
+            solicitado = float(encabezado)
+        except ValueError:
+            solicitado = 0
+        if solicitado > 0 and math.isfinite(solicitado):  # 'inf' o 'nan' se ignoran
+            tiempo_limite = min(tiempo_limite, solicitado) if tiempo_limite > 0 else solicitado
+    return tiempo_limite
+
+
+# Respuesta para las sentencias canceladas por superar el tiempo límite
+def respuesta_tiempo_agotado(ex):
+    return jsonify({"error": "La consulta superó el tiempo límite y fue cancelada.", "detalle": str(ex)}), 504
+
+
+# Obtiene el formato de exportación pedido en la URL (?format=csv|ndjson); None si se pide JSON
+def obtener_formato_exportacion():
+    formato = (request.args.get('format') or request.args.get('formato') or 'json').lower()
+    if formato == 'json':
+        return None
+    if formato not in FORMATOS_EXPORTACION:
+        raise ValueError(f"Formato no soportado: {formato}. Use json, csv o ndjson.")
+    return formato
+
+
+# Construye una respuesta en flujo que escribe las filas directamente desde el cursor, por lotes
+def respuesta_exportacion(consulta_sql, parametros, formato, nombre_archivo):
+    # Se respeta la calidad indicada por el cliente: 'gzip;q=0' rechaza la compresión
+    comprimir = request.accept_encodings.quality('gzip') > 0
+
+    # Se usa una conexión propia porque la respuesta sigue leyendo del cursor después de salir de la vista
+    contenido = exportar(ControlConexion(), consulta_sql, parametros, formato,
+                         tamano_lote=current_app.config['EXPORTACION_TAMANO_LOTE'], comprimir=comprimir,
+                         tiempo_limite=obtener_tiempo_limite())
+
+    # stream_with_context mantiene la solicitud (y su cupo de admisión) activa hasta terminar el envío
+    respuesta = Response(stream_with_context(contenido), content_type=FORMATOS_EXPORTACION[formato])
+    respuesta.headers['Content-Disposition'] = f'attachment; filename="{nombre_archivo}.{formato}"'
+    respuesta.headers['Vary'] = 'Accept-Encoding'
+    if comprimir:
+        respuesta.headers['Content-Encoding'] = 'gzip'
+    return respuesta
+
+
+@api.route('/')
 def home():
     return "¡Bienvenido a la API Flask!"
 
 # Ruta para listar entidades
-@app.route('/api/<string:proyecto>/<string:tabla>', methods=['GET'])
+@api.route('/api/<string:proyecto>/<string:tabla>', methods=['GET'])
 #@jwt_required()  # Requiere autenticación JWT para acceder a esta ruta
 def listar_entidades(proyecto, tabla):
     """Listar todas las filas de una tabla dada"""
@@ -46,19 +154,31 @@ def listar_entidades(proyecto, tabla):
         return jsonify({"mensaje": "El nombre de la tabla no puede estar vacío."}), 400
 
     try:
-        control_conexion.abrir_bd()  # Abre la conexión a la base de datos
+        formato = obtener_formato_exportacion()
+    except ValueError as ex:
+        return jsonify({"mensaje": str(ex)}), 400
+
+    try:
+        # Exportación en flujo (CSV / NDJSON) sin cargar la tabla completa en memoria
+        if formato:
+            return respuesta_exportacion(f"SELECT * FROM {tabla}", None, formato, tabla)
+
+        control_conexion.abrir_bd(obtener_tiempo_limite())  # Abre la conexión a la base de datos
         comando_sql = f"SELECT * FROM {tabla}"
-        resultado = control_conexion.ejecutar_consulta_sql(comando_sql, None)
+        resultado = control_conexion.ejecutar_consulta_sql(comando_sql, None, como_entidades=True)
         control_conexion.cerrar_bd()  # Cierra la conexión a la base de datos
 
-        lista = [dict(fila) for fila in resultado]
+        lista = [fila.obtener_propiedades() for fila in resultado]
         return jsonify(lista), 200
+    except TiempoLimiteExcedido as ex:
+        control_conexion.cerrar_bd()
+        return respuesta_tiempo_agotado(ex)
     except Exception as ex:
         return jsonify({"error": str(ex)}), 500
 
 
 # Ruta para obtener una entidad por una clave específica
-@app.route('/api/<string:proyecto>/<string:tabla>/<string:clave>/<string:valor>', methods=['GET'])
+@api.route('/api/<string:proyecto>/<string:tabla>/<string:clave>/<string:valor>', methods=['GET'])
 #@jwt_required() 
 def obtener_entidad_por_clave(proyecto, tabla, clave, valor):
     """Obtener una fila específica de una tabla basada en una clave y su valor"""
@@ -66,19 +186,15 @@ def obtener_entidad_por_clave(proyecto, tabla, clave, valor):
         return jsonify({"mensaje": "El nombre de la tabla, clave y valor no pueden estar vacíos."}), 400
 
     try:
-        control_conexion.abrir_bd()
-        
-        # Consulta para obtener el tipo de dato de la columna
-        comando_sql = """
-            SELECT data_type FROM information_schema.columns 
-            WHERE table_name = ? AND column_name = ?
-        """
-        tipo_dato_resultado = control_conexion.ejecutar_consulta_sql(comando_sql, (tabla, clave))
+        control_conexion.abrir_bd(obtener_tiempo_limite())
         
-        if not tipo_dato_resultado or len(tipo_dato_resultado) == 0:
+        # Obtener el tipo de dato de la columna (desde la caché del esquema o information_schema)
+        data_type = cache_esquema.obtener_tipo_dato(control_conexion, tabla, clave)
+
+        if not data_type:
+            control_conexion.cerrar_bd()
             return jsonify({"mensaje": "No se pudo determinar el tipo de dato."}), 404
 
-        data_type = tipo_dato_resultado[0]['data_type'].lower()
         print(f"Tipo de dato detectado para {clave}: {data_type}")
         
         # Construcción de la consulta SQL según el tipo de dato
@@ -128,12 +244,15 @@ def obtener_entidad_por_clave(proyecto, tabla, clave, valor):
 
         return jsonify(resultado), 200
 
+    except TiempoLimiteExcedido as ex:
+        control_conexion.cerrar_bd()
+        return respuesta_tiempo_agotado(ex)
     except Exception as ex:
         print(f"Error: {str(ex)}")
         return jsonify({"error": "No se pudo ejecutar la consulta SQL."}), 500
 
 # Ruta para crear una nueva entidad
-@app.route('/api/<string:proyecto>/<string:tabla>', methods=['POST'])
+@api.route('/api/<string:proyecto>/<string:tabla>', methods=['POST'])
 #@jwt_required() 
 def crear_entidad(proyecto, tabla):
     """Crear una nueva fila en la tabla especificada"""
@@ -148,7 +267,8 @@ def crear_entidad(proyecto, tabla):
             if any(pk in key.lower() for pk in password_keys):  # Si detecta un campo de contraseña
                 plain_password = datos[key]
                 if plain_password:  # Si el campo de contraseña no está vacío
-                    hashed_password = bcrypt.hashpw(plain_password.encode('utf-8'), bcrypt.gensalt())  # Hashea la contraseña
+                    with medir("hash"):
+                        hashed_password = bcrypt.hashpw(plain_password.encode('utf-8'), bcrypt.gensalt())  # Hashea la contraseña
                     datos[key] = hashed_password.decode('utf-8')  # Guardar el hash como string
 
         # Construir la consulta SQL
@@ -158,17 +278,20 @@ def crear_entidad(proyecto, tabla):
         
         # Ejecutar la consulta SQL
         valores = tuple(datos.values())
-        control_conexion.abrir_bd()
+        control_conexion.abrir_bd(obtener_tiempo_limite())
         control_conexion.ejecutar_comando_sql(comando_sql, valores)
         control_conexion.cerrar_bd()
 
         return jsonify({"mensaje": "Entidad creada exitosamente."}), 201
+    except TiempoLimiteExcedido as ex:
+        control_conexion.cerrar_bd()
+        return respuesta_tiempo_agotado(ex)
     except Exception as ex:
         return jsonify({"error": str(ex)}), 500
 
 
 # Ruta para actualizar una entidad
-@app.route('/api/<string:proyecto>/<string:tabla>/<string:clave>/<string:valor>', methods=['PUT'])
+@api.route('/api/<string:proyecto>/<string:tabla>/<string:clave>/<string:valor>', methods=['PUT'])
 #@jwt_required()
 def actualizar_entidad(proyecto, tabla, clave, valor):
     """Actualizar una fila en la tabla basada en una clave"""
@@ -184,28 +307,31 @@ def actualizar_entidad(proyecto, tabla, clave, valor):
             if any(pk in key.lower() for pk in password_keys):  # Si detecta un campo de contraseña
                 plain_password = entidad_data[key]
                 if plain_password:  # Si el campo de contraseña no está vacío
-                    hashed_password = bcrypt.hashpw(plain_password.encode('utf-8'), bcrypt.gensalt())  # Hashea la contraseña
+                    with medir("hash"):
+                        hashed_password = bcrypt.hashpw(plain_password.encode('utf-8'), bcrypt.gensalt())  # Hashea la contraseña
                     entidad_data[key] = hashed_password.decode('utf-8')  # Guardar el hash como string
 
-        # Construir la consulta SQL para la actualización
-        actualizaciones = ', '.join([f"{k} = ?" for k in entidad_data.keys()])  # Crear las asignaciones para SET
-        comando_sql = f"UPDATE {tabla} SET {actualizaciones} WHERE {clave} = ?"
+        # Todos los campos del cuerpo quedan marcados como modificados y se escriben, sin leer antes la fila
+        entidad = Entidad()
+        for nombre, nuevo_valor in entidad_data.items():
+            entidad[nombre] = nuevo_valor
 
-        # Construir los valores para la consulta, incluyendo el valor de la clave
-        valores = list(entidad_data.values()) + [valor]
-
-        # Ejecutar la consulta SQL
-        control_conexion.abrir_bd()  # Abre la conexión a la base de datos
-        control_conexion.ejecutar_comando_sql(comando_sql, valores)  # Ejecuta la actualización
+        control_conexion.abrir_bd(obtener_tiempo_limite())  # Abre la conexión a la base de datos
+        filas_afectadas = control_conexion.actualizar_entidad(tabla, entidad, clave, valor)  # Ejecuta la actualización
         control_conexion.cerrar_bd()  # Cierra la conexión
 
+        if filas_afectadas == 0:
+            return jsonify({"mensaje": "Entidad no encontrada."}), 404
         return jsonify({"mensaje": "Entidad actualizada exitosamente."}), 200
+    except TiempoLimiteExcedido as ex:
+        control_conexion.cerrar_bd()
+        return respuesta_tiempo_agotado(ex)
     except Exception as ex:
         return jsonify({"error": str(ex)}), 500
 
 
 # Ruta para eliminar una entidad
-@app.route('/api/<string:proyecto>/<string:tabla>/<string:clave>/<string:valor>', methods=['DELETE'])
+@api.route('/api/<string:proyecto>/<string:tabla>/<string:clave>/<string:valor>', methods=['DELETE'])
 #@jwt_required()
 def eliminar_entidad(proyecto, tabla, clave, valor):
     """Eliminar una fila de la tabla basada en una clave"""
@@ -215,16 +341,19 @@ def eliminar_entidad(proyecto, tabla, clave, valor):
     try:
         # Usar ? como marcador de parámetros para SQL Server ODBC
         comando_sql = f"DELETE FROM {tabla} WHERE {clave} = ?"
-        control_conexion.abrir_bd()
+        control_conexion.abrir_bd(obtener_tiempo_limite())
         control_conexion.ejecutar_comando_sql(comando_sql, (valor,))
         control_conexion.cerrar_bd()
 
         return jsonify({"mensaje": "Entidad eliminada exitosamente."}), 200
+    except TiempoLimiteExcedido as ex:
+        control_conexion.cerrar_bd()
+        return respuesta_tiempo_agotado(ex)
     except Exception as ex:
         return jsonify({"error": str(ex)}), 500
 
 
-@app.route('/api/<string:proyecto>/ejecutar-consulta-parametrizada', methods=['POST'])
+@api.route('/api/<string:proyecto>/ejecutar-consulta-parametrizada', methods=['POST'])
 def ejecutar_consulta_parametrizada(proyecto):
     """Ejecutar una consulta SQL parametrizada"""
     cuerpo_solicitud = request.get_json()
@@ -242,11 +371,29 @@ def ejecutar_consulta_parametrizada(proyecto):
             for clave, valor in cuerpo_solicitud['parametros'].items():
                 parametros.append(valor)  # Agrega los valores directamente como tupla
 
+        # Modo asíncrono: encolar la consulta y responder de inmediato con el identificador del trabajo
+        if cuerpo_solicitud.get('asincrono') or request.args.get('modo') == 'asincrono':
+            try:
+                id_trabajo = gestor_trabajos.enviar(consulta_sql, parametros)
+            except ColaTrabajosLlena as ex:
+                return jsonify({"mensaje": str(ex)}), 503, {"Retry-After": "30"}
+
+            url_estado = url_for('api.obtener_estado_trabajo', proyecto=proyecto, id_trabajo=id_trabajo)
+            return jsonify({"trabajo": id_trabajo, "estado": "pendiente", "url_estado": url_estado}), 202, {"Location": url_estado}
+
+        # Exportación en flujo (CSV / NDJSON) sin cargar el resultado completo en memoria
+        try:
+            formato = obtener_formato_exportacion()
+        except ValueError as ex:
+            return jsonify({"mensaje": str(ex)}), 400
+        if formato:
+            return respuesta_exportacion(consulta_sql, parametros, formato, "consulta")
+
         # Abrir la conexión a la base de datos
-        control_conexion.abrir_bd()
+        control_conexion.abrir_bd(obtener_tiempo_limite())
 
         # Ejecutar la consulta SQL con los parámetros
-        resultado = control_conexion.ejecutar_consulta_sql(consulta_sql, parametros)
+        resultado = control_conexion.ejecutar_consulta_sql(consulta_sql, parametros, como_entidades=True)
 
         # Cerrar la conexión a la base de datos
         control_conexion.cerrar_bd()
@@ -256,10 +403,13 @@ def ejecutar_consulta_parametrizada(proyecto):
             return jsonify({"mensaje": "No se encontraron resultados para la consulta proporcionada."}), 404
 
         # Procesar resultados a formato JSON
-        lista = [dict(fila) for fila in resultado]
+        lista = [fila.obtener_propiedades() for fila in resultado]
 
         return jsonify(lista), 200
 
+    except TiempoLimiteExcedido as ex:
+        control_conexion.cerrar_bd()
+        return respuesta_tiempo_agotado(ex)
     except Exception as ex:
         # Manejo de excepciones
         control_conexion.cerrar_bd()
@@ -267,8 +417,49 @@ def ejecutar_consulta_parametrizada(proyecto):
         return jsonify({"error": "Se presentó un error:", "detalle": str(ex)}), 500
 
 
+# Ruta para consultar el estado de un trabajo asíncrono
+@api.route('/api/<string:proyecto>/trabajos/<string:id_trabajo>', methods=['GET'])
+def obtener_estado_trabajo(proyecto, id_trabajo):
+    """Consultar el estado de un trabajo asíncrono"""
+    estado = gestor_trabajos.obtener_estado(id_trabajo)
+    if estado is None:
+        return jsonify({"mensaje": "Trabajo no encontrado o expirado."}), 404
+
+    if estado["estado"] == "completado":
+        estado["url_resultado"] = url_for('api.obtener_resultado_trabajo', proyecto=proyecto, id_trabajo=id_trabajo)
+    return jsonify(estado), 200
+
+
+# Ruta para descargar el resultado de un trabajo asíncrono, por páginas o como flujo NDJSON
+@api.route('/api/<string:proyecto>/trabajos/<string:id_trabajo>/resultado', methods=['GET'])
+def obtener_resultado_trabajo(proyecto, id_trabajo):
+    """Obtener el resultado de un trabajo asíncrono"""
+    try:
+        if 'pagina' in request.args:
+            pagina = request.args.get('pagina', type=int)
+            tamano = request.args.get('tamano', 100, type=int)
+            if not pagina or pagina < 1 or not tamano or tamano < 1:
+                return jsonify({"mensaje": "Los parámetros 'pagina' y 'tamano' deben ser enteros positivos."}), 400
+
+            filas = gestor_trabajos.leer_pagina(id_trabajo, pagina, tamano)
+            return jsonify({"pagina": pagina, "tamano": tamano, "filas": filas}), 200
+
+        return Response(gestor_trabajos.iterar_resultado(id_trabajo), mimetype='application/x-ndjson')
+    except KeyError:
+        return jsonify({"mensaje": "Trabajo no encontrado o expirado."}), 404
+    except ValueError as ex:
+        return jsonify({"mensaje": str(ex)}), 409
+
+
+# Ruta para consultar los contadores de sentencias SQL (lentas y canceladas por tiempo límite)
+@api.route('/api/estadisticas-sql', methods=['GET'])
+def estadisticas_sql():
+    """Obtener los contadores de sentencias SQL del proceso"""
+    return jsonify(obtener_estadisticas_sql()), 200
+
+
 # Ruta de ejemplo para autenticación (login) - genera un token JWT
-@app.route('/api/login', methods=['POST'])
+@api.route('/api/login', methods=['POST'])
 def login():
     """Autenticación de usuario y generación de un token JWT"""
     if not request.is_json:
@@ -285,14 +476,19 @@ def login():
     return jsonify(access_token=token_acceso), 200
 
 
-# Iniciar la aplicación
+# Iniciar la aplicación con el servidor de desarrollo (en producción usar: gunicorn -c gunicorn.conf.py)
 if __name__ == '__main__':
-    app.run(debug=True, port=5184)
+    app = crear_app()
+    preparar_trabajador(app)
+    app.run(debug=app.config['DEBUG'], port=5184)
 
 
 """
 Modos de uso:
 
+Servidor de producción (varios procesos trabajadores, ver gunicorn.conf.py):
+gunicorn -c gunicorn.conf.py
+
 GET
 http://localhost:5184/api/proyecto/usuario
 http://localhost:5184/api/proyecto/usuario/email/admin@empresa.com
@@ -312,6 +508,22 @@ http://localhost:5184/api/proyecto/usuario/email/nuevo.nuevo@empresa.com
 
 DELETE
 http://localhost:5184/api/proyecto/usuario/email/nuevo.nuevo@empresa.com
+
+POST (consulta asíncrona, responde 202 con el identificador del trabajo)
+http://localhost:5184/api/proyecto/ejecutar-consulta-parametrizada?modo=asincrono
+{
+    "consulta": "SELECT * FROM factura WHERE fecha >= ?",
+    "parametros": {"fecha": "2024-01-01"}
+}
+
+GET / POST (exportación en flujo, con gzip si el cliente envía Accept-Encoding: gzip)
+http://localhost:5184/api/proyecto/factura?format=csv
+http://localhost:5184/api/proyecto/ejecutar-consulta-parametrizada?format=ndjson
+
+GET (estado y resultado del trabajo asíncrono)
+http://localhost:5184/api/proyecto/trabajos/<id_trabajo>
+http://localhost:5184/api/proyecto/trabajos/<id_trabajo>/resultado?pagina=1&tamano=100
+http://localhost:5184/api/proyecto/trabajos/<id_trabajo>/resultado
 """
 """
 Códigos de estado HTTP:
@@ -24,6 +24,58 @@ class Config:
     # Configuración adicional de SQLAlchemy
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Tiempo límite (segundos) de cada sentencia SQL; el encabezado X-Tiempo-Limite solo puede reducirlo (0 sin límite)
+    SQL_TIEMPO_LIMITE = float(os.getenv('SQL_TIEMPO_LIMITE', '30'))
+
+    # Conexiones abiertas que conserva cada proceso trabajador
+    SQL_TAMANO_POOL = int(os.getenv('SQL_TAMANO_POOL', '4'))
+
+    # Servidor de producción: procesos trabajadores (0 = calcular según los núcleos), hilos por proceso
+    # y segundos que se esperan las solicitudes en curso al apagar
+    SERVIDOR_TRABAJADORES = int(os.getenv('SERVIDOR_TRABAJADORES', '0'))
+    SERVIDOR_HILOS = int(os.getenv('SERVIDOR_HILOS', '8'))
+    SERVIDOR_TIEMPO_APAGADO = int(os.getenv('SERVIDOR_TIEMPO_APAGADO', '30'))
+
+    # Configuración de los trabajos asíncronos (consultas largas con resultados en disco)
+    # El directorio guarda el estado y el resultado de cada trabajo; todos los procesos trabajadores deben compartirlo.
+    # Si no se indica se usa <instance_path>/trabajos. Se crea con permisos solo para el usuario del servidor.
+    TRABAJOS_DIRECTORIO = os.getenv('TRABAJOS_DIRECTORIO')
+    TRABAJOS_MAX_HILOS = int(os.getenv('TRABAJOS_MAX_HILOS', '2'))
+    TRABAJOS_MAX_PENDIENTES = int(os.getenv('TRABAJOS_MAX_PENDIENTES', '16'))
+    TRABAJOS_TTL_SEGUNDOS = int(os.getenv('TRABAJOS_TTL_SEGUNDOS', '3600'))
+    TRABAJOS_TAMANO_LOTE = int(os.getenv('TRABAJOS_TAMANO_LOTE', '1000'))
+    TRABAJOS_FILAS_POR_BLOQUE = int(os.getenv('TRABAJOS_FILAS_POR_BLOQUE', '1000'))
+    TRABAJOS_TIEMPO_LIMITE = float(os.getenv('TRABAJOS_TIEMPO_LIMITE', '600'))
+    # Segundos que se esperan los trabajos cancelados al apagar; debe ser menor que SERVIDOR_TIEMPO_APAGADO
+    TRABAJOS_TIEMPO_APAGADO = float(os.getenv('TRABAJOS_TIEMPO_APAGADO', '5'))
+
+    # Configuración de la exportación en flujo (CSV / NDJSON)
+    EXPORTACION_TAMANO_LOTE = int(os.getenv('EXPORTACION_TAMANO_LOTE', '1000'))
+
+    # Control de admisión: solicitudes simultáneas (global y por ruta) y cuota por cliente.
+    # Los límites y la cuota se aplican por proceso trabajador, no a todo el servidor. Por defecto el límite
+    # global deja 2 hilos libres de SERVIDOR_HILOS, que atienden los rechazos (503) sin esperar en cola.
+    ADMISION_MAX_SOLICITUDES = int(os.getenv('ADMISION_MAX_SOLICITUDES', str(max(1, SERVIDOR_HILOS - 2))))
+    ADMISION_LIMITES_RUTA = {
+        'api.listar_entidades': int(os.getenv('ADMISION_LIMITE_LISTAR', str(max(1, ADMISION_MAX_SOLICITUDES // 2)))),
+        'api.ejecutar_consulta_parametrizada': int(os.getenv('ADMISION_LIMITE_CONSULTA', str(max(1, ADMISION_MAX_SOLICITUDES // 2)))),
+    }
+    ADMISION_TOKENS_CAPACIDAD = int(os.getenv('ADMISION_TOKENS_CAPACIDAD', '20'))
+    ADMISION_TOKENS_POR_SEGUNDO = float(os.getenv('ADMISION_TOKENS_POR_SEGUNDO', '10'))
+    ADMISION_RETRY_AFTER = int(os.getenv('ADMISION_RETRY_AFTER', '1'))
+
+    # Número de proxies de confianza delante de la API (por ejemplo, el frontend) cuyo X-Forwarded-For se
+    # usa como IP del cliente para la cuota. 0 lo ignora; solo debe activarse si la API no es accesible
+    # directamente, porque cualquier cliente podría falsificar el encabezado.
+    PROXIES_CONFIABLES = int(os.getenv('PROXIES_CONFIABLES', '0'))
+
+    # Perfilado: 1 de cada N solicitudes (0 desactiva), token del encabezado X-Perfil para perfilar
+    # a pedido y descargar las capturas, tamaño del buffer y umbral (segundos) de solicitud lenta
+    PERFIL_MUESTREO = int(os.getenv('PERFIL_MUESTREO', '0'))
+    PERFIL_TOKEN = os.getenv('PERFIL_TOKEN')
+    PERFIL_MAX_CAPTURAS = int(os.getenv('PERFIL_MAX_CAPTURAS', '50'))
+    PERFIL_UMBRAL_LENTO = float(os.getenv('PERFIL_UMBRAL_LENTO', '2.0'))
+
 # Opcional: configuración de desarrollo específica
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -33,3 +85,8 @@ class DevelopmentConfig(Config):
 class ProductionConfig(Config):
     DEBUG = False
     ENV = 'production'
+
+config = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+}
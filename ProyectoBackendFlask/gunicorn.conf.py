@@ -0,0 +1,49 @@
+# Configuración de gunicorn para producción: gunicorn -c gunicorn.conf.py
+import multiprocessing
+import os
+
+from config import Config
+
+# Aplicación WSGI y dirección de escucha
+wsgi_app = "wsgi:app"
+bind = os.getenv("SERVIDOR_DIRECCION", "0.0.0.0:5184")
+
+# Procesos trabajadores: los de la configuración o, si es 0, según los núcleos disponibles.
+# Cada proceso atiende varias solicitudes a la vez con hilos (la API espera sobre todo a la base de datos).
+workers = Config.SERVIDOR_TRABAJADORES or multiprocessing.cpu_count() * 2 + 1
+worker_class = "gthread"
+
+# Debe haber más hilos que solicitudes admitidas (ADMISION_MAX_SOLICITUDES, por trabajador): si todos los hilos
+# estuvieran ocupados, las solicitudes nuevas esperarían en la cola de gunicorn en lugar de recibir un 503 inmediato
+threads = max(Config.SERVIDOR_HILOS, Config.ADMISION_MAX_SOLICITUDES + 2)
+
+# La aplicación se carga en cada trabajador (después del fork), así cada uno tiene sus propias
+# conexiones e hilos de fondo
+preload_app = False
+
+# Apagado ordenado: al recibir SIGTERM se dejan de aceptar conexiones y se esperan las solicitudes en curso
+graceful_timeout = Config.SERVIDOR_TIEMPO_APAGADO
+timeout = max(60, int(Config.SQL_TIEMPO_LIMITE) * 2)
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+
+
+def post_worker_init(worker):
+    # Se ejecuta en cada trabajador después del fork y de cargar la aplicación, antes de aceptar tráfico:
+    # crea el pool de conexiones del trabajador y carga la caché del esquema
+    from app import preparar_trabajador
+
+    if preparar_trabajador(worker.wsgi):
+        worker.log.info("Trabajador %s listo (pool de conexiones y caché de esquema cargados).", worker.pid)
+    else:
+        worker.log.warning("Trabajador %s listo sin precarga; las conexiones y el esquema se cargarán bajo demanda.", worker.pid)
+
+
+def worker_exit(server, worker):
+    # Se ejecuta al terminar el trabajador: cancela los trabajos asíncronos en curso (esperándolos como máximo
+    # TRABAJOS_TIEMPO_APAGADO, menor que graceful_timeout) y cierra las conexiones
+    from app import cerrar_trabajador
+
+    cerrar_trabajador(worker.wsgi)
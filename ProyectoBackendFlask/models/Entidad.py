@@ -1,19 +1,107 @@
 # models/Entidad.py
-from typing import Any, Dict
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+
+class VistaEntidad(Mapping):
+    # Vista de solo lectura de las propiedades de una entidad; no copia los valores
+    __slots__ = ("_entidad",)
+
+    def __init__(self, entidad: "Entidad"):
+        self._entidad = entidad
+
+    def __getitem__(self, nombre: str) -> Any:
+        if nombre not in self._entidad:
+            raise KeyError(nombre)
+        return self._entidad[nombre]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._entidad.keys())
+
+    def __len__(self) -> int:
+        return len(self._entidad)
+
 
 class Entidad:
-    def __init__(self, propiedades_iniciales: Dict[str, Any] = None):
-        # Inicializa un diccionario de propiedades. Si no se pasa uno, crea un diccionario vacío.
-        self.propiedades = propiedades_iniciales if propiedades_iniciales is not None else {}
+    # Registro compacto: guarda la fila tal como la devuelve pyodbc (tupla) y una referencia al
+    # índice columna -> posición, compartido por todas las filas del mismo resultado.
+    # Los valores asignados después se guardan aparte y marcan la columna como modificada.
+    __slots__ = ("_fila", "_indice", "_cambios")
+
+    def __init__(self, propiedades_iniciales: Dict[str, Any] = None,
+                 fila: Optional[Sequence[Any]] = None, indice: Optional[Dict[str, int]] = None):
+        if fila is not None:
+            # Construcción desde una fila de base de datos y el índice compartido del resultado
+            self._fila = fila
+            self._indice = indice if indice is not None else {}
+        else:
+            # Construcción desde un diccionario (o vacía), como antes
+            propiedades = propiedades_iniciales if propiedades_iniciales is not None else {}
+            self._fila = tuple(propiedades.values())
+            self._indice = {nombre: i for i, nombre in enumerate(propiedades)}
+        self._cambios = None
+
+    @staticmethod
+    def crear_indice(columnas: Sequence[str]) -> Dict[str, int]:
+        # Crea el índice columna -> posición que comparten las entidades de un mismo resultado
+        return {nombre: i for i, nombre in enumerate(columnas)}
 
     def __getitem__(self, nombre: str) -> Any:
         # Obtiene el valor asociado a la clave (nombre). Retorna None si no existe.
-        return self.propiedades.get(nombre)
+        if self._cambios is not None and nombre in self._cambios:
+            return self._cambios[nombre]
+        posicion = self._indice.get(nombre)
+        return self._fila[posicion] if posicion is not None else None
 
     def __setitem__(self, nombre: str, valor: Any) -> None:
-        # Asigna un valor a la clave especificada.
-        self.propiedades[nombre] = valor
+        # Asigna un valor a la clave especificada y la marca como modificada.
+        if self._cambios is None:
+            self._cambios = {}
+        self._cambios[nombre] = valor
+
+    def __contains__(self, nombre: str) -> bool:
+        return nombre in self._indice or (self._cambios is not None and nombre in self._cambios)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def keys(self):
+        # Nombres de las propiedades (columnas de la fila más las agregadas después); permite dict(entidad)
+        if not self._cambios:
+            return list(self._indice)
+        return list(self._indice) + [nombre for nombre in self._cambios if nombre not in self._indice]
+
+    @property
+    def propiedades(self) -> VistaEntidad:
+        # Vista de solo lectura de las propiedades (sin copiar)
+        return VistaEntidad(self)
 
     def obtener_propiedades(self) -> Dict[str, Any]:
         # Devuelve una copia del diccionario de propiedades.
-        return dict(self.propiedades)
+        propiedades = {nombre: self._fila[posicion] for nombre, posicion in self._indice.items()}
+        if self._cambios:
+            propiedades.update(self._cambios)
+        return propiedades
+
+    def campos_modificados(self) -> Dict[str, Any]:
+        # Devuelve las propiedades asignadas desde que se cargó (o confirmó) la entidad.
+        return dict(self._cambios) if self._cambios else {}
+
+    def confirmar_cambios(self) -> None:
+        # Incorpora los cambios a la fila (por ejemplo, después de guardarlos) y los deja de marcar como modificados.
+        if not self._cambios:
+            return
+        nuevas = [nombre for nombre in self._cambios if nombre not in self._indice]
+        if nuevas:
+            # Las columnas nuevas requieren un índice propio; se deja de compartir el del resultado
+            self._indice = dict(self._indice)
+            for nombre in nuevas:
+                self._indice[nombre] = len(self._indice)
+        valores = list(self._fila) + [None] * len(nuevas)
+        for nombre, valor in self._cambios.items():
+            valores[self._indice[nombre]] = valor
+        self._fila = tuple(valores)
+        self._cambios = None
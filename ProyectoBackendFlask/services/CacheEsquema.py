@@ -0,0 +1,45 @@
+import threading
+
+
+class CacheEsquema:
+    """Guarda en memoria el tipo de dato de cada columna (tabla, columna) para no
+    consultar information_schema en cada solicitud.
+    """
+
+    def __init__(self):
+        self._tipos = {}
+        self._bloqueo = threading.Lock()
+
+    def precargar(self, control_conexion):
+        """Carga los tipos de todas las columnas de la base de datos (la conexión debe estar abierta)."""
+        filas = control_conexion.ejecutar_consulta_sql(
+            "SELECT table_name, column_name, data_type FROM information_schema.columns", None
+        )
+        tipos = {(fila['table_name'].lower(), fila['column_name'].lower()): fila['data_type'].lower() for fila in filas}
+        with self._bloqueo:
+            self._tipos = tipos
+        print(f"Caché de esquema cargada con {len(tipos)} columnas.")
+
+    def obtener_tipo_dato(self, control_conexion, tabla, columna):
+        """Devuelve el tipo de dato de la columna, consultándolo si aún no está en caché; None si no existe."""
+        clave = (tabla.lower(), columna.lower())
+        tipo = self._tipos.get(clave)
+        if tipo is not None:
+            return tipo
+
+        resultado = control_conexion.ejecutar_consulta_sql(
+            "SELECT data_type FROM information_schema.columns WHERE table_name = ? AND column_name = ?",
+            (tabla, columna),
+        )
+        if not resultado:
+            return None
+
+        tipo = resultado[0]['data_type'].lower()
+        with self._bloqueo:
+            self._tipos[clave] = tipo
+        return tipo
+
+    def limpiar(self):
+        """Vacía la caché (por ejemplo, después de cambios en el esquema)."""
+        with self._bloqueo:
+            self._tipos = {}
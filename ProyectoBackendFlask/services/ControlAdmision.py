@@ -0,0 +1,134 @@
+import math
+import threading
+import time
+
+from flask import g, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+
+class AlmacenTokensMemoria:
+    """Almacén en memoria para los cubos de tokens de cada cliente.
+
+    Cualquier otro almacén (por ejemplo, uno compartido entre procesos) solo necesita
+    implementar el método ``consumir`` con la misma firma.
+    """
+
+    def __init__(self, max_claves=10000):
+        self._cubos = {}
+        self._bloqueo = threading.Lock()
+        self._max_claves = max_claves
+
+    def consumir(self, clave, capacidad, tasa):
+        """Intenta consumir un token del cubo de ``clave``.
+
+        Returns:
+            tuple: (permitido, segundos de espera hasta el siguiente token).
+        """
+        ahora = time.monotonic()
+        with self._bloqueo:
+            tokens, ultimo = self._cubos.get(clave, (capacidad, ahora))
+            tokens = min(capacidad, tokens + (ahora - ultimo) * tasa)
+
+            if tokens >= 1:
+                self._cubos[clave] = (tokens - 1, ahora)
+                permitido, espera = True, 0.0
+            else:
+                self._cubos[clave] = (tokens, ahora)
+                permitido, espera = False, (1 - tokens) / tasa
+
+            if len(self._cubos) > self._max_claves:
+                self._purgar(ahora, capacidad, tasa)
+        return permitido, espera
+
+    def _purgar(self, ahora, capacidad, tasa):
+        # Los cubos que ya se habrían llenado de nuevo equivalen a no tener registro
+        llenado = capacidad / tasa
+        for clave in [c for c, (_, ultimo) in self._cubos.items() if ahora - ultimo >= llenado]:
+            del self._cubos[clave]
+
+
+def identificar_cliente():
+    """Identifica al cliente por la identidad del JWT si viene en la solicitud, o por su IP.
+
+    Detrás del frontend o de un proxy, ``request.remote_addr`` es la IP del cliente original
+    solo si la aplicación confía en X-Forwarded-For (PROXIES_CONFIABLES); si no, todos los
+    usuarios del frontend comparten la cuota de su IP.
+    """
+    try:
+        verify_jwt_in_request(optional=True)
+        identidad = get_jwt_identity()
+        if identidad:
+            return f"jwt:{identidad}"
+    except Exception:
+        pass
+    return f"ip:{request.remote_addr}"
+
+
+class ControlAdmision:
+    """Control de admisión: límite global de solicitudes en curso, límites por ruta
+    y limitación de frecuencia por cliente (cubo de tokens).
+
+    Cuando el servicio está saturado responde de inmediato con 503 (o 429 si el
+    cliente superó su cuota) y el encabezado ``Retry-After``, en lugar de encolar.
+    """
+
+    def __init__(self, app=None, almacen=None, identificar_cliente=identificar_cliente):
+        self._almacen = almacen if almacen is not None else AlmacenTokensMemoria()
+        self._identificar_cliente = identificar_cliente
+        self._semaforo_global = None
+        self._semaforos_ruta = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Lee la configuración y registra los ganchos de la aplicación."""
+        app.config.setdefault('ADMISION_MAX_SOLICITUDES', 64)
+        app.config.setdefault('ADMISION_LIMITES_RUTA', {})
+        app.config.setdefault('ADMISION_TOKENS_CAPACIDAD', 20)
+        app.config.setdefault('ADMISION_TOKENS_POR_SEGUNDO', 10.0)
+        app.config.setdefault('ADMISION_RETRY_AFTER', 1)
+
+        self._capacidad = app.config['ADMISION_TOKENS_CAPACIDAD']
+        self._tasa = app.config['ADMISION_TOKENS_POR_SEGUNDO']
+        self._retry_after = app.config['ADMISION_RETRY_AFTER']
+        self._semaforo_global = threading.BoundedSemaphore(app.config['ADMISION_MAX_SOLICITUDES'])
+        self._semaforos_ruta = {
+            ruta: threading.BoundedSemaphore(limite)
+            for ruta, limite in app.config['ADMISION_LIMITES_RUTA'].items()
+        }
+
+        app.before_request(self._admitir)
+        app.teardown_request(self._liberar)
+
+    def _admitir(self):
+        g.admision_semaforos = []
+        if request.method == 'OPTIONS':
+            return None
+
+        # 1. Cuota por cliente
+        if self._tasa > 0:
+            permitido, espera = self._almacen.consumir(self._identificar_cliente(), self._capacidad, self._tasa)
+            if not permitido:
+                return self._rechazar(429, "Demasiadas solicitudes. Intente más tarde.", espera)
+
+        # 2. Límite global de solicitudes en curso
+        if not self._semaforo_global.acquire(blocking=False):
+            return self._rechazar(503, "El servicio está saturado. Intente más tarde.")
+        g.admision_semaforos.append(self._semaforo_global)
+
+        # 3. Límite de la ruta, si es una ruta costosa
+        semaforo_ruta = self._semaforos_ruta.get(request.endpoint)
+        if semaforo_ruta is not None:
+            if not semaforo_ruta.acquire(blocking=False):
+                return self._rechazar(503, "La ruta está saturada. Intente más tarde.")
+            g.admision_semaforos.append(semaforo_ruta)
+        return None
+
+    def _liberar(self, excepcion=None):
+        semaforos = g.pop('admision_semaforos', [])
+        for semaforo in reversed(semaforos):
+            semaforo.release()
+
+    def _rechazar(self, codigo, mensaje, espera=None):
+        segundos = max(1, math.ceil(espera)) if espera is not None else self._retry_after
+        return jsonify({"mensaje": mensaje}), codigo, {"Retry-After": str(segundos)}
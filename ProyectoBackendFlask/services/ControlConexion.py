@@ -1,18 +1,140 @@
+import math
 import os
+import queue
+import threading
+import time
 import pyodbc
 from dotenv import load_dotenv
+from models.Entidad import Entidad
+from services.Perfilador import describir_parametros, medir, registrar_consulta
 
 # Cargar las variables del archivo .env
 load_dotenv()
 
+# Estados SQL con los que el controlador ODBC informa que se agotó el tiempo o se canceló la sentencia
+ESTADOS_TIEMPO_AGOTADO = ("HYT00", "HYT01", "HY008")
+
+
+class TiempoLimiteExcedido(RuntimeError):
+    """Se lanza cuando una sentencia SQL supera el tiempo límite y es cancelada."""
+
+
+def _es_tiempo_agotado(ex):
+    # Indica si el error del controlador corresponde a una sentencia cancelada o fuera de tiempo
+    return bool(ex.args) and ex.args[0] in ESTADOS_TIEMPO_AGOTADO
+
+
+# Contadores de consultas lentas y canceladas, compartidos por todas las conexiones del proceso
+_bloqueo_estadisticas = threading.Lock()
+_estadisticas_sql = {"sentencias": 0, "lentas": 0, "canceladas": 0}
+
+
+def obtener_estadisticas_sql():
+    # Devuelve una copia de los contadores de sentencias SQL
+    with _bloqueo_estadisticas:
+        return dict(_estadisticas_sql)
+
+
+def _contar(**incrementos):
+    with _bloqueo_estadisticas:
+        for clave, valor in incrementos.items():
+            _estadisticas_sql[clave] += valor
+
+
+class PoolConexiones:
+    """Conjunto de conexiones abiertas que se reutilizan entre solicitudes del mismo proceso."""
+
+    def __init__(self, cadena_conexion, tamano, tiempo_limite_login):
+        self._cadena_conexion = cadena_conexion
+        self._tiempo_limite_login = tiempo_limite_login
+        self._libres = queue.LifoQueue(maxsize=tamano)
+
+    def precargar(self):
+        # Abre de antemano todas las conexiones para no pagar el costo en la primera solicitud
+        while not self._libres.full():
+            self._libres.put_nowait(pyodbc.connect(self._cadena_conexion, timeout=self._tiempo_limite_login))
+
+    def obtener(self):
+        # Reutiliza una conexión libre o abre una nueva si todas están en uso
+        try:
+            return self._libres.get_nowait()
+        except queue.Empty:
+            return pyodbc.connect(self._cadena_conexion, timeout=self._tiempo_limite_login)
+
+    def devolver(self, conexion):
+        # Deshace lo que haya quedado sin confirmar; si la conexión falla o el pool está lleno, se cierra
+        try:
+            conexion.rollback()
+            conexion.timeout = 0
+            self._libres.put_nowait(conexion)
+        except (pyodbc.Error, queue.Full):
+            conexion.close()
+
+    def cerrar(self):
+        while True:
+            try:
+                self._libres.get_nowait().close()
+            except queue.Empty:
+                break
+            except pyodbc.Error:
+                pass
+
+
+# Pool del proceso; se crea en cada trabajador del servidor con inicializar_pool()
+_pool = None
+
+
+def inicializar_pool(tamano):
+    # Crea (y llena) el pool de conexiones del proceso actual
+    global _pool
+    proveedor = os.getenv("DATABASE_PROVIDER")
+    cadena_conexion = os.getenv(f"{proveedor.upper()}_CONNECTION_STRING")
+    tiempo_limite_login = int(os.getenv("SQL_TIEMPO_LIMITE_LOGIN", "15"))
+    cerrar_pool()
+    _pool = PoolConexiones(cadena_conexion, tamano, tiempo_limite_login)
+    _pool.precargar()
+    print(f"Pool de conexiones inicializado con {tamano} conexiones.")
+
+
+def cerrar_pool():
+    # Cierra las conexiones libres del pool del proceso actual
+    global _pool
+    if _pool is not None:
+        _pool.cerrar()
+        _pool = None
+
+
 class ControlConexion:
     def __init__(self):
-        self._conexion_bd = None  # Variable para almacenar la conexión a la base de datos
+        # La conexión y su tiempo límite se guardan por hilo, para que varias solicitudes
+        # simultáneas puedan usar la misma instancia sin compartir la conexión
+        self._estado_hilo = threading.local()
         self._proveedor = os.getenv("DATABASE_PROVIDER")  # Proveedor de base de datos
         self._cadena_conexion = os.getenv(f"{self._proveedor.upper()}_CONNECTION_STRING")  # Cadena de conexión
+        self._tiempo_limite_login = int(os.getenv("SQL_TIEMPO_LIMITE_LOGIN", "15"))  # Segundos para establecer la conexión
+        self._umbral_consulta_lenta = float(os.getenv("SQL_UMBRAL_CONSULTA_LENTA", "1.0"))  # Segundos
+        self._cursor_en_curso = None  # Cursor de ejecutar_consulta_por_lotes, para poder cancelarlo desde otro hilo
+
+    # Conexión a la base de datos del hilo actual
+    @property
+    def _conexion_bd(self):
+        return getattr(self._estado_hilo, "conexion_bd", None)
+
+    @_conexion_bd.setter
+    def _conexion_bd(self, conexion):
+        self._estado_hilo.conexion_bd = conexion
 
-    # Método para abrir la base de datos
-    def abrir_bd(self):
+    # Tiempo límite (segundos) de cada sentencia en la conexión del hilo actual
+    @property
+    def _tiempo_limite(self):
+        return getattr(self._estado_hilo, "tiempo_limite", None)
+
+    @_tiempo_limite.setter
+    def _tiempo_limite(self, tiempo_limite):
+        self._estado_hilo.tiempo_limite = tiempo_limite
+
+    # Método para abrir la base de datos; tiempo_limite (segundos) se aplica a cada sentencia ejecutada
+    def abrir_bd(self, tiempo_limite=None):
         try:
             # Verifica si el proveedor y la cadena de conexión están configurados
             if not self._proveedor or not self._cadena_conexion:
@@ -23,11 +145,19 @@ class ControlConexion:
 
             # Abre la conexión según el proveedor configurado
             if self._proveedor in ["LocalDb", "SqlServer"]:
-                # Usar pyodbc para conectarse a SQL Server y LocalDb
-                self._conexion_bd = pyodbc.connect(self._cadena_conexion)
+                # Usar pyodbc para conectarse a SQL Server y LocalDb (desde el pool si el proceso tiene uno)
+                with medir("conexion"):
+                    if _pool is not None:
+                        self._conexion_bd = _pool.obtener()
+                    else:
+                        self._conexion_bd = pyodbc.connect(self._cadena_conexion, timeout=self._tiempo_limite_login)
             else:
                 raise ValueError("Proveedor de base de datos no soportado. Solo se soportan LocalDb y SqlServer.")
             
+            # Tiempo límite de las consultas (pyodbc solo acepta segundos enteros; 0 desactiva el límite)
+            self._tiempo_limite = tiempo_limite if tiempo_limite and tiempo_limite > 0 else None
+            self._conexion_bd.timeout = math.ceil(self._tiempo_limite) if self._tiempo_limite else 0
+
             print("Conexión a la base de datos abierta exitosamente.")
         except Exception as ex:
             print(f"Ocurrió una excepción: {str(ex)}")
@@ -36,9 +166,14 @@ class ControlConexion:
     # Método para cerrar la conexión a la base de datos
     def cerrar_bd(self):
         try:
-            # Verifica si la conexión está abierta y luego la cierra
-            if self._conexion_bd:
-                self._conexion_bd.close()
+            # Verifica si la conexión está abierta y luego la cierra (o la devuelve al pool)
+            conexion = self._conexion_bd
+            if conexion:
+                self._conexion_bd = None
+                if _pool is not None:
+                    _pool.devolver(conexion)
+                else:
+                    conexion.close()
                 print("Conexión a la base de datos cerrada exitosamente.")
         except Exception as ex:
             print(f"Ocurrió una excepción al cerrar la conexión: {str(ex)}")
@@ -55,24 +190,23 @@ class ControlConexion:
             cursor = self._conexion_bd.cursor()
             print(f"Ejecutando comando: {consulta_sql}")
 
-            # Ejecuta el comando con los parámetros proporcionados
-            if parametros:
-                print(f"Parámetros: {parametros}")
-                cursor.execute(consulta_sql, parametros)
-            else:
-                cursor.execute(consulta_sql)
+            # Ejecuta el comando con los parámetros proporcionados, respetando el tiempo límite
+            self._ejecutar(cursor, consulta_sql, parametros)
 
             # Realiza commit para guardar los cambios
             self._conexion_bd.commit()
             filas_afectadas = cursor.rowcount
             print(f"Número de filas afectadas: {filas_afectadas}")
             return filas_afectadas
+        except TiempoLimiteExcedido:
+            raise
         except Exception as ex:
             print(f"Ocurrió una excepción: {str(ex)}")
             raise RuntimeError("No se pudo ejecutar el comando SQL.") from ex
 
     # Método para ejecutar una consulta SQL y devolver los resultados como una lista de diccionarios
-    def ejecutar_consulta_sql(self, consulta_sql, parametros=None):
+    # (o de Entidad, que comparten un único índice de columnas, si como_entidades=True)
+    def ejecutar_consulta_sql(self, consulta_sql, parametros=None, como_entidades=False):
         try:
             # Verifica si la conexión está abierta antes de ejecutar la consulta
             if not self._conexion_bd:
@@ -82,25 +216,125 @@ class ControlConexion:
             cursor = self._conexion_bd.cursor()
             print(f"Ejecutando consulta: {consulta_sql}")
 
-            # Ejecuta la consulta con los parámetros proporcionados
-            if parametros:
-                print(f"Parámetros: {parametros}")
-                cursor.execute(consulta_sql, parametros)
-            else:
-                cursor.execute(consulta_sql)
+            # Ejecuta la consulta con los parámetros proporcionados, respetando el tiempo límite
+            self._ejecutar(cursor, consulta_sql, parametros)
 
-            # Obtiene todos los resultados de la consulta
-            resultado = cursor.fetchall()
+            # Obtiene todos los resultados de la consulta (el tiempo límite también puede vencer durante la lectura)
+            try:
+                with medir("sql"):
+                    resultado = cursor.fetchall()
+            except pyodbc.Error as ex:
+                self._verificar_tiempo_agotado(ex, consulta_sql, parametros)
+                raise
             columnas = [column[0] for column in cursor.description]
 
-            # Convierte los resultados en una lista de diccionarios
-            filas = [dict(zip(columnas, fila)) for fila in resultado]
+            # Convierte los resultados en una lista de entidades o de diccionarios
+            if como_entidades:
+                indice = Entidad.crear_indice(columnas)
+                filas = [Entidad(fila=fila, indice=indice) for fila in resultado]
+            else:
+                filas = [dict(zip(columnas, fila)) for fila in resultado]
             print(f"Número de filas devueltas: {len(filas)}")
             return filas
+        except TiempoLimiteExcedido:
+            raise
         except Exception as ex:
             print(f"Ocurrió una excepción: {str(ex)}")
             raise RuntimeError("No se pudo ejecutar la consulta SQL.") from ex
 
+    # Método para ejecutar una consulta SQL y recorrer los resultados por lotes sin cargarlos todos en memoria
+    def ejecutar_consulta_por_lotes(self, consulta_sql, parametros=None, tamano_lote=1000):
+        try:
+            # Verifica si la conexión está abierta antes de ejecutar la consulta
+            if not self._conexion_bd:
+                raise RuntimeError("La conexión a la base de datos no está abierta.")
+
+            # Crea un cursor para ejecutar la consulta
+            cursor = self._conexion_bd.cursor()
+            self._cursor_en_curso = cursor
+            print(f"Ejecutando consulta por lotes: {consulta_sql}")
+
+            # Ejecuta la consulta con los parámetros proporcionados, respetando el tiempo límite
+            self._ejecutar(cursor, consulta_sql, parametros)
+
+            columnas = [column[0] for column in cursor.description]
+        except TiempoLimiteExcedido:
+            raise
+        except Exception as ex:
+            self._cursor_en_curso = None
+            print(f"Ocurrió una excepción: {str(ex)}")
+            raise RuntimeError("No se pudo ejecutar la consulta SQL.") from ex
+
+        # Generador que entrega las filas (tuplas) en lotes de tamaño fijo desde el cursor
+        def lotes():
+            try:
+                while True:
+                    try:
+                        filas = cursor.fetchmany(tamano_lote)
+                    except pyodbc.Error as ex:
+                        self._verificar_tiempo_agotado(ex, consulta_sql, parametros)
+                        raise
+                    if not filas:
+                        break
+                    yield filas
+            finally:
+                self._cursor_en_curso = None
+                cursor.close()
+
+        return columnas, lotes()
+
+    # Método para cancelar (desde otro hilo) la consulta por lotes que se esté ejecutando en esta instancia
+    def cancelar(self):
+        cursor = self._cursor_en_curso
+        if cursor is not None:
+            try:
+                cursor.cancel()
+            except pyodbc.Error as ex:
+                print(f"No se pudo cancelar la consulta: {str(ex)}")
+
+    # Método para guardar una entidad: actualiza solo las columnas modificadas de la fila donde clave = valor
+    def actualizar_entidad(self, tabla, entidad, clave, valor):
+        cambios = entidad.campos_modificados()
+        if not cambios:
+            return 0
+
+        actualizaciones = ', '.join([f"{k} = ?" for k in cambios.keys()])
+        comando_sql = f"UPDATE {tabla} SET {actualizaciones} WHERE {clave} = ?"
+        filas_afectadas = self.ejecutar_comando_sql(comando_sql, list(cambios.values()) + [valor])
+        entidad.confirmar_cambios()
+        return filas_afectadas
+
+    # Si el error indica que la sentencia se canceló por tiempo, lo cuenta y lanza TiempoLimiteExcedido
+    def _verificar_tiempo_agotado(self, ex, consulta_sql, parametros, sentencias=0):
+        if not _es_tiempo_agotado(ex):
+            return
+        _contar(sentencias=sentencias, canceladas=1)
+        print(f"Sentencia cancelada por tiempo límite ({self._tiempo_limite} s): {consulta_sql} parámetros={describir_parametros(parametros)}")
+        raise TiempoLimiteExcedido(f"La consulta superó el tiempo límite de {self._tiempo_limite} segundos.") from ex
+
+    # Ejecuta una sentencia en el cursor; el controlador la cancela al vencer el tiempo límite de la conexión
+    # (connection.timeout) y en ese caso se lanza TiempoLimiteExcedido
+    def _ejecutar(self, cursor, consulta_sql, parametros):
+        inicio = time.perf_counter()
+        try:
+            with medir("sql"):
+                if parametros:
+                    print(f"Parámetros: {parametros}")
+                    cursor.execute(consulta_sql, parametros)
+                else:
+                    cursor.execute(consulta_sql)
+        except pyodbc.Error as ex:
+            self._verificar_tiempo_agotado(ex, consulta_sql, parametros, sentencias=1)
+            raise
+        finally:
+            duracion = time.perf_counter() - inicio
+            registrar_consulta(consulta_sql, parametros, duracion)
+
+        lenta = duracion >= self._umbral_consulta_lenta
+        _contar(sentencias=1, lentas=int(lenta))
+        if lenta:
+            print(f"Consulta lenta ({duracion:.3f} s): {consulta_sql} parámetros={describir_parametros(parametros)}")
+
     # Método para crear un parámetro de consulta SQL
     def crear_parametro(self, nombre, valor):
         # En Python, los parámetros se manejan como un simple par clave-valor
@@ -0,0 +1,67 @@
+import csv
+import io
+import json
+import zlib
+
+# Formatos de exportación soportados y su tipo de contenido
+FORMATOS_EXPORTACION = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def generar_csv(columnas, lotes):
+    """Genera el contenido CSV por lotes: primero el encabezado y luego un bloque por cada lote de filas."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(columnas)
+    yield buffer.getvalue().encode("utf-8")
+
+    for lote in lotes:
+        buffer.seek(0)
+        buffer.truncate(0)
+        escritor.writerows(lote)
+        yield buffer.getvalue().encode("utf-8")
+
+
+def generar_ndjson(columnas, lotes):
+    """Genera el contenido NDJSON por lotes: un objeto JSON por fila y una fila por línea."""
+    for lote in lotes:
+        lineas = [json.dumps(dict(zip(columnas, fila)), default=str, ensure_ascii=False) for fila in lote]
+        yield ("\n".join(lineas) + "\n").encode("utf-8")
+
+
+def comprimir_gzip(bloques, nivel=6):
+    """Comprime al vuelo un generador de bloques de bytes en formato gzip."""
+    compresor = zlib.compressobj(nivel, zlib.DEFLATED, 31)
+    for bloque in bloques:
+        datos = compresor.compress(bloque)
+        if datos:
+            yield datos
+    yield compresor.flush()
+
+
+def exportar(control_conexion, consulta_sql, parametros, formato, tamano_lote=1000, comprimir=False, tiempo_limite=None):
+    """Ejecuta la consulta y devuelve un generador con el resultado exportado en el formato pedido.
+
+    La conexión se abre al llamar a esta función y se cierra cuando el generador termina
+    (o cuando el servidor lo cierra porque el cliente se desconectó).
+    """
+    control_conexion.abrir_bd(tiempo_limite)
+    try:
+        columnas, lotes = control_conexion.ejecutar_consulta_por_lotes(consulta_sql, parametros, tamano_lote)
+    except Exception:
+        control_conexion.cerrar_bd()
+        raise
+
+    generador = generar_csv if formato == "csv" else generar_ndjson
+
+    def contenido():
+        try:
+            bloques = generador(columnas, lotes)
+            yield from comprimir_gzip(bloques) if comprimir else bloques
+        finally:
+            lotes.close()
+            control_conexion.cerrar_bd()
+
+    return contenido()
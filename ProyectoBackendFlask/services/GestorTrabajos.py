@@ -0,0 +1,317 @@
+import gzip
+import itertools
+import json
+import os
+import re
+import stat
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class ColaTrabajosLlena(RuntimeError):
+    """Se lanza cuando no se admiten más trabajos pendientes."""
+
+
+class TrabajoInterrumpido(RuntimeError):
+    """Se lanza dentro de un trabajo cuando el servidor se detiene antes de que termine."""
+
+
+# Los identificadores forman parte del nombre de los archivos; solo se aceptan los generados por enviar()
+_PATRON_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _crear_directorio_privado(ruta):
+    # Los resultados contienen datos de la base: el directorio debe ser del usuario del servidor y solo accesible
+    # por él, para que otro usuario del equipo no pueda leerlos ni colocar archivos que luego se sirvan
+    os.makedirs(ruta, mode=0o700, exist_ok=True)
+    info = os.lstat(ruta)
+    if not stat.S_ISDIR(info.st_mode):
+        raise RuntimeError(f"{ruta} no es un directorio.")
+    if hasattr(os, "getuid"):  # En Windows no hay propietario ni permisos POSIX que revisar
+        if info.st_uid != os.getuid():
+            raise RuntimeError(f"El directorio {ruta} pertenece a otro usuario.")
+        if stat.S_IMODE(info.st_mode) & 0o077:
+            os.chmod(ruta, 0o700)
+
+
+def _abrir_privado(ruta, flags):
+    # opener de open(): los archivos se crean con permisos 0600 sin depender de la umask
+    return os.open(ruta, flags, 0o600)
+
+
+class GestorTrabajos:
+    """Ejecuta consultas largas en segundo plano y guarda sus filas en archivos
+    comprimidos (NDJSON + gzip) en disco, para consultarlas luego por páginas o
+    como flujo.
+
+    Cada trabajo deja en TRABAJOS_DIRECTORIO tres archivos: ``<id>.json`` con el estado,
+    ``<id>.ndjson.gz`` con el resultado y ``<id>.tmp`` mientras se escribe. Como el estado
+    se lee del disco, cualquier proceso trabajador del servidor puede responder por un
+    trabajo iniciado en otro (el directorio debe ser compartido por todos).
+    """
+
+    def __init__(self, fabrica_conexion, app=None):
+        """Inicializa el gestor.
+
+        Args:
+            fabrica_conexion (callable): Función que crea una ControlConexion nueva por trabajo.
+            app (Flask): Aplicación de la que se lee la configuración (opcional, ver init_app).
+        """
+        self._fabrica_conexion = fabrica_conexion
+        self._activos = set()  # Trabajos pendientes o en ejecución en este proceso
+        self._futuros = {}  # id -> Future de los trabajos de este proceso que aún no terminan
+        self._conexiones = {}  # id -> ControlConexion de los trabajos en ejecución, para cancelarlos al apagar
+        self._bloqueo = threading.Lock()
+        self._ejecutor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Lee la configuración de la aplicación y arranca el ejecutor y el hilo de limpieza.
+
+        Configuración usada:
+            TRABAJOS_DIRECTORIO: Carpeta donde se guardan los archivos de resultados (por defecto, <instance_path>/trabajos).
+            TRABAJOS_MAX_HILOS: Número máximo de consultas ejecutándose a la vez.
+            TRABAJOS_MAX_PENDIENTES: Número máximo de trabajos en cola o en ejecución en este proceso.
+            TRABAJOS_TTL_SEGUNDOS: Tiempo que se conservan los archivos de un trabajo.
+            TRABAJOS_TAMANO_LOTE: Filas leídas del cursor en cada lote.
+            TRABAJOS_FILAS_POR_BLOQUE: Filas de cada bloque gzip del resultado (unidad de acceso por páginas).
+            TRABAJOS_TIEMPO_LIMITE: Segundos máximos de ejecución de la consulta (0 sin límite).
+        """
+        self._directorio = app.config['TRABAJOS_DIRECTORIO'] or os.path.join(app.instance_path, 'trabajos')
+        self._max_pendientes = app.config['TRABAJOS_MAX_PENDIENTES']
+        self._ttl_segundos = app.config['TRABAJOS_TTL_SEGUNDOS']
+        self._tamano_lote = app.config['TRABAJOS_TAMANO_LOTE']
+        self._filas_por_bloque = app.config['TRABAJOS_FILAS_POR_BLOQUE']
+        self._tiempo_limite = app.config['TRABAJOS_TIEMPO_LIMITE']
+        self._ejecutor = ThreadPoolExecutor(max_workers=app.config['TRABAJOS_MAX_HILOS'], thread_name_prefix="trabajo-sql")
+        _crear_directorio_privado(self._directorio)
+
+        # Elimina lo que hayan dejado procesos anteriores y luego revisa periódicamente
+        self.limpiar_expirados()
+        self._detener = threading.Event()
+        self._hilo_limpieza = threading.Thread(target=self._ciclo_limpieza, daemon=True)
+        self._hilo_limpieza.start()
+
+    def enviar(self, consulta_sql, parametros=None):
+        """Encola una consulta y devuelve el identificador del trabajo."""
+        with self._bloqueo:
+            if len(self._activos) >= self._max_pendientes:
+                raise ColaTrabajosLlena("Hay demasiados trabajos pendientes. Intente más tarde.")
+            id_trabajo = uuid.uuid4().hex
+            self._activos.add(id_trabajo)
+
+        self._guardar_estado({
+            "id": id_trabajo,
+            "estado": "pendiente",
+            "creado": time.time(),
+            "finalizado": None,
+            "columnas": None,
+            "filas": 0,
+            "error": None,
+        })
+        futuro = self._ejecutor.submit(self._ejecutar, id_trabajo, consulta_sql, parametros)
+        with self._bloqueo:
+            self._futuros[id_trabajo] = futuro
+        futuro.add_done_callback(lambda _: self._olvidar_futuro(id_trabajo))
+        return id_trabajo
+
+    def obtener_estado(self, id_trabajo):
+        """Devuelve una copia pública del estado del trabajo o None si no existe."""
+        trabajo = self._leer_estado(id_trabajo)
+        if trabajo is None:
+            return None
+        return {k: v for k, v in trabajo.items() if k != "bloques"}
+
+    def leer_pagina(self, id_trabajo, pagina, tamano):
+        """Devuelve la página solicitada (base 1) del resultado como lista de diccionarios."""
+        trabajo = self._trabajo_completado(id_trabajo)
+        columnas = trabajo["columnas"]
+        inicio = (pagina - 1) * tamano
+        bloques = trabajo["bloques"]
+        indice_bloque = inicio // self._filas_por_bloque_de(trabajo)
+        if indice_bloque >= len(bloques):
+            return []
+
+        # Se salta directamente al bloque gzip que contiene la primera fila de la página
+        with open(self._ruta(id_trabajo, ".ndjson.gz"), "rb") as crudo:
+            crudo.seek(bloques[indice_bloque])
+            with gzip.open(crudo, "rt", encoding="utf-8") as archivo:
+                desde = inicio - indice_bloque * self._filas_por_bloque_de(trabajo)
+                return [dict(zip(columnas, json.loads(linea))) for linea in itertools.islice(archivo, desde, desde + tamano)]
+
+    def iterar_resultado(self, id_trabajo):
+        """Devuelve un generador con el resultado completo en formato NDJSON (una fila por línea)."""
+        trabajo = self._trabajo_completado(id_trabajo)
+        columnas = trabajo["columnas"]
+        ruta = self._ruta(id_trabajo, ".ndjson.gz")
+
+        def lineas():
+            with gzip.open(ruta, "rt", encoding="utf-8") as archivo:
+                for linea in archivo:
+                    yield json.dumps(dict(zip(columnas, json.loads(linea))), ensure_ascii=False) + "\n"
+
+        return lineas()
+
+    def limpiar_expirados(self):
+        """Elimina del directorio los archivos de trabajos cuyo tiempo de vida ya venció.
+
+        Se decide por la fecha de modificación de cada archivo, así también se eliminan los
+        resultados y temporales que dejó un proceso que se reinició o terminó de forma abrupta.
+        """
+        limite = time.time() - self._ttl_segundos
+        with self._bloqueo:
+            activos = set(self._activos)
+
+        eliminados = 0
+        for entrada in os.scandir(self._directorio):
+            id_trabajo = entrada.name.split(".", 1)[0]
+            if id_trabajo in activos or not entrada.is_file():
+                continue
+            try:
+                if entrada.stat().st_mtime < limite:
+                    os.remove(entrada.path)
+                    eliminados += 1
+            except FileNotFoundError:
+                pass  # Otro proceso lo eliminó primero
+            except OSError as ex:
+                print(f"No se pudo eliminar el archivo {entrada.path}: {str(ex)}")
+        return eliminados
+
+    def cerrar(self, tiempo_espera=None):
+        """Detiene el hilo de limpieza y el ejecutor de trabajos.
+
+        Los trabajos que aún no empezaron se descartan y los que están en ejecución se
+        cancelan; ambos quedan en estado "error" para que los clientes no esperen un
+        resultado que no llegará. Se espera a que terminen como máximo tiempo_espera
+        segundos (None = sin límite), que debe ser menor que el tiempo de apagado del servidor.
+        """
+        if self._ejecutor is None:
+            return
+        self._detener.set()
+        with self._bloqueo:
+            futuros = dict(self._futuros)
+            conexiones = list(self._conexiones.values())
+        self._ejecutor.shutdown(wait=False, cancel_futures=True)
+
+        for id_trabajo, futuro in futuros.items():
+            if futuro.cancelled():
+                self._marcar_error(id_trabajo, "El servidor se detuvo antes de iniciar el trabajo.")
+                with self._bloqueo:
+                    self._activos.discard(id_trabajo)
+
+        # Interrumpe las consultas en curso; cada trabajo registra su propio error al recibir la cancelación
+        for control_conexion in conexiones:
+            control_conexion.cancelar()
+        _, pendientes = wait([f for f in futuros.values() if not f.cancelled()], timeout=tiempo_espera)
+        if pendientes:
+            print(f"{len(pendientes)} trabajos no terminaron antes del apagado.")
+
+    def _ruta(self, id_trabajo, extension):
+        return os.path.join(self._directorio, f"{id_trabajo}{extension}")
+
+    def _filas_por_bloque_de(self, trabajo):
+        return trabajo.get("filas_por_bloque") or self._filas_por_bloque
+
+    def _leer_estado(self, id_trabajo):
+        if not _PATRON_ID.match(id_trabajo):
+            return None
+        try:
+            with open(self._ruta(id_trabajo, ".json"), encoding="utf-8") as archivo:
+                return json.load(archivo)
+        except FileNotFoundError:
+            return None
+
+    def _guardar_estado(self, trabajo):
+        # Escritura atómica: los demás procesos nunca leen un archivo de estado a medio escribir
+        ruta = self._ruta(trabajo["id"], ".json")
+        temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}"
+        with open(temporal, "w", encoding="utf-8", opener=_abrir_privado) as archivo:
+            json.dump(trabajo, archivo)
+        os.replace(temporal, ruta)
+
+    def _marcar_error(self, id_trabajo, mensaje):
+        trabajo = self._leer_estado(id_trabajo)
+        if trabajo is not None:
+            trabajo.update(estado="error", error=mensaje, finalizado=time.time())
+            self._guardar_estado(trabajo)
+
+    def _olvidar_futuro(self, id_trabajo):
+        with self._bloqueo:
+            self._futuros.pop(id_trabajo, None)
+
+    def _trabajo_completado(self, id_trabajo):
+        trabajo = self._leer_estado(id_trabajo)
+        if trabajo is None:
+            raise KeyError(id_trabajo)
+        if trabajo["estado"] != "completado":
+            raise ValueError(f"El trabajo está en estado '{trabajo['estado']}'.")
+        return trabajo
+
+    def _ejecutar(self, id_trabajo, consulta_sql, parametros):
+        # Cada trabajo usa su propia conexión para no compartirla con las solicitudes en curso
+        trabajo = self._leer_estado(id_trabajo)
+        trabajo["estado"] = "ejecutando"
+        self._guardar_estado(trabajo)
+
+        ruta = self._ruta(id_trabajo, ".ndjson.gz")
+        ruta_temporal = self._ruta(id_trabajo, ".tmp")
+        control_conexion = self._fabrica_conexion()
+        with self._bloqueo:
+            self._conexiones[id_trabajo] = control_conexion
+        lotes = None
+        try:
+            control_conexion.abrir_bd(self._tiempo_limite)
+            columnas, lotes = control_conexion.ejecutar_consulta_por_lotes(consulta_sql, parametros, self._tamano_lote)
+
+            # El resultado se escribe como una serie de miembros gzip de TRABAJOS_FILAS_POR_BLOQUE filas;
+            # la posición de cada uno permite leer una página sin descomprimir lo anterior
+            bloques, pendientes, filas = [], [], 0
+            with open(ruta_temporal, "wb", opener=_abrir_privado) as archivo:
+                def escribir_bloque():
+                    bloques.append(archivo.tell())
+                    archivo.write(gzip.compress("".join(pendientes).encode("utf-8"), mtime=0))
+                    pendientes.clear()
+
+                for lote in lotes:
+                    if self._detener.is_set():
+                        raise TrabajoInterrumpido("El servidor se detuvo antes de terminar el trabajo.")
+                    for fila in lote:
+                        pendientes.append(json.dumps(list(fila), default=str, ensure_ascii=False) + "\n")
+                        if len(pendientes) == self._filas_por_bloque:
+                            escribir_bloque()
+                    filas += len(lote)
+                    trabajo["filas"] = filas
+                    self._guardar_estado(trabajo)
+                if pendientes:
+                    escribir_bloque()
+
+            os.replace(ruta_temporal, ruta)
+            trabajo.update(estado="completado", columnas=columnas, filas=filas, bloques=bloques,
+                           filas_por_bloque=self._filas_por_bloque, finalizado=time.time())
+            self._guardar_estado(trabajo)
+        except Exception as ex:
+            # Al apagar, la consulta se cancela desde cerrar() y el controlador lo informa como sentencia cancelada
+            mensaje = "El servidor se detuvo antes de terminar el trabajo." if self._detener.is_set() else str(ex)
+            print(f"Error en el trabajo {id_trabajo}: {str(ex)}")
+            if os.path.exists(ruta_temporal):
+                os.remove(ruta_temporal)
+            trabajo.update(estado="error", error=mensaje, finalizado=time.time())
+            self._guardar_estado(trabajo)
+        finally:
+            with self._bloqueo:
+                self._activos.discard(id_trabajo)
+                self._conexiones.pop(id_trabajo, None)
+            if lotes is not None:
+                lotes.close()  # Cierra el cursor antes de devolver la conexión
+            try:
+                control_conexion.cerrar_bd()
+            except RuntimeError:
+                pass
+
+    def _ciclo_limpieza(self):
+        intervalo = max(1, min(60, self._ttl_segundos // 2))
+        while not self._detener.wait(intervalo):
+            self.limpiar_expirados()
@@ -0,0 +1,184 @@
+import cProfile
+import hmac
+import io
+import itertools
+import pstats
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+from flask import Response, abort, g, jsonify, request
+from flask.json.provider import DefaultJSONProvider
+
+# Estado de la solicitud en curso en cada hilo: tiempos por categoría y consultas ejecutadas.
+# Fuera de una solicitud (por ejemplo, en los trabajos asíncronos) vale None y medir() no hace nada.
+_estado = threading.local()
+
+# cProfile admite un solo perfil activo por proceso (desde Python 3.12 enable() falla si hay otro);
+# si ya se está perfilando otra solicitud, la nueva se atiende sin perfil
+_bloqueo_perfil = threading.Lock()
+
+
+def describir_parametros(parametros):
+    """Describe la forma de los parámetros (tipos y cantidad) sin exponer sus valores."""
+    if not parametros:
+        return "()"
+    return "(" + ", ".join(type(valor).__name__ for valor in parametros) + ")"
+
+
+@contextmanager
+def medir(categoria):
+    """Suma el tiempo del bloque a la categoría indicada (sql, hash, serializacion...) de la solicitud actual."""
+    tiempos = getattr(_estado, "tiempos", None)
+    if tiempos is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        tiempos[categoria] = tiempos.get(categoria, 0.0) + time.perf_counter() - inicio
+
+
+def registrar_consulta(consulta_sql, parametros, duracion):
+    """Anota una sentencia SQL (texto y forma de los parámetros) en la solicitud actual."""
+    consultas = getattr(_estado, "consultas", None)
+    if consultas is not None:
+        consultas.append({"sql": consulta_sql, "parametros": describir_parametros(parametros), "duracion": round(duracion, 6)})
+
+
+class ProveedorJsonMedido(DefaultJSONProvider):
+    # Proveedor JSON que mide el tiempo de serialización de las respuestas
+    def dumps(self, obj, **kwargs):
+        with medir("serializacion"):
+            return super().dumps(obj, **kwargs)
+
+
+class Perfilador:
+    """Perfilado opcional de solicitudes.
+
+    Perfila con cProfile una de cada N solicitudes (PERFIL_MUESTREO) o las que traen el
+    encabezado X-Perfil con el token autorizado (PERFIL_TOKEN). Cada solicitud perfilada o
+    lenta (PERFIL_UMBRAL_LENTO) se guarda en un buffer circular de PERFIL_MAX_CAPTURAS
+    elementos, que se descarga desde /api/admin/perfiles con el mismo token.
+    """
+
+    def __init__(self, app=None):
+        self._capturas = deque()
+        self._bloqueo = threading.Lock()
+        self._contador = itertools.count(1)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Lee la configuración, registra los ganchos y las rutas de administración."""
+        app.config.setdefault('PERFIL_MUESTREO', 0)
+        app.config.setdefault('PERFIL_TOKEN', None)
+        app.config.setdefault('PERFIL_MAX_CAPTURAS', 50)
+        app.config.setdefault('PERFIL_UMBRAL_LENTO', 2.0)
+        app.config.setdefault('PERFIL_LINEAS', 40)
+
+        self._muestreo = app.config['PERFIL_MUESTREO']
+        self._token = app.config['PERFIL_TOKEN']
+        self._umbral_lento = app.config['PERFIL_UMBRAL_LENTO']
+        self._lineas = app.config['PERFIL_LINEAS']
+        self._capturas = deque(maxlen=app.config['PERFIL_MAX_CAPTURAS'])
+
+        app.json = ProveedorJsonMedido(app)
+        app.before_request(self._iniciar)
+        app.after_request(self._finalizar)
+        app.teardown_request(self._limpiar)
+        app.add_url_rule('/api/admin/perfiles', 'perfiles', self._listar_capturas, methods=['GET'])
+        app.add_url_rule('/api/admin/perfiles/<string:id_captura>', 'perfil', self._descargar_captura, methods=['GET'])
+
+    def _token_valido(self):
+        encabezado = request.headers.get('X-Perfil', '')
+        # Se comparan bytes: compare_digest no admite str con caracteres fuera de ASCII
+        return bool(self._token) and hmac.compare_digest(encabezado.encode('utf-8'), self._token.encode('utf-8'))
+
+    def _iniciar(self):
+        _estado.tiempos = {}
+        _estado.consultas = []
+        g.perfil_inicio = time.perf_counter()
+        g.perfil = None
+
+        muestreada = self._muestreo > 0 and next(self._contador) % self._muestreo == 0
+        if (muestreada or self._token_valido()) and _bloqueo_perfil.acquire(blocking=False):
+            perfil = cProfile.Profile()
+            try:
+                perfil.enable()
+            except ValueError:
+                # Otra herramienta de perfilado (ajena a este perfilador) está activa
+                _bloqueo_perfil.release()
+                return
+            g.perfil = perfil
+
+    def _finalizar(self, respuesta):
+        perfil = g.pop('perfil', None)
+        if perfil is not None:
+            perfil.disable()
+            _bloqueo_perfil.release()
+
+        inicio = g.get('perfil_inicio')
+        if inicio is None:
+            return respuesta
+        duracion = time.perf_counter() - inicio
+        lenta = duracion >= self._umbral_lento
+        if perfil is None and not lenta:
+            return respuesta
+
+        captura = {
+            "id": uuid.uuid4().hex,
+            "fecha": time.time(),
+            "metodo": request.method,
+            "ruta": request.path,
+            "estado": respuesta.status_code,
+            "duracion": round(duracion, 6),
+            "tiempos": {k: round(v, 6) for k, v in getattr(_estado, "tiempos", {}).items()},
+            "consultas": list(getattr(_estado, "consultas", [])),
+            "perfil": self._resumen_perfil(perfil) if perfil is not None else None,
+        }
+        with self._bloqueo:
+            self._capturas.append(captura)
+
+        if lenta:
+            print(f"Solicitud lenta ({duracion:.3f} s): {request.method} {request.path} tiempos={captura['tiempos']}")
+            for consulta in captura["consultas"]:
+                print(f"  SQL ({consulta['duracion']:.3f} s): {consulta['sql']} parámetros={consulta['parametros']}")
+        return respuesta
+
+    def _limpiar(self, excepcion=None):
+        # Si la solicitud falló antes de after_request, el perfil sigue activo y hay que liberarlo
+        perfil = g.pop('perfil', None)
+        if perfil is not None:
+            perfil.disable()
+            _bloqueo_perfil.release()
+        _estado.tiempos = None
+        _estado.consultas = None
+
+    def _resumen_perfil(self, perfil):
+        salida = io.StringIO()
+        pstats.Stats(perfil, stream=salida).sort_stats("cumulative").print_stats(self._lineas)
+        return salida.getvalue()
+
+    def _listar_capturas(self):
+        """Listar las capturas guardadas (sin el detalle del perfil)"""
+        if not self._token_valido():
+            abort(403)
+        with self._bloqueo:
+            capturas = [{k: v for k, v in c.items() if k != "perfil"} for c in self._capturas]
+        return jsonify(capturas), 200
+
+    def _descargar_captura(self, id_captura):
+        """Descargar una captura: JSON completo o, con ?formato=texto, solo el informe de cProfile"""
+        if not self._token_valido():
+            abort(403)
+        with self._bloqueo:
+            captura = next((c for c in self._capturas if c["id"] == id_captura), None)
+        if captura is None:
+            return jsonify({"mensaje": "Captura no encontrada."}), 404
+        if request.args.get('formato') == 'texto':
+            return Response(captura["perfil"] or "", mimetype='text/plain')
+        return jsonify(captura), 200